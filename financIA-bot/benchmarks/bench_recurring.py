@@ -0,0 +1,93 @@
+"""
+Mede a detecção de recorrências/anomalias sobre um histórico sintético.
+
+Uso (a partir de financIA-bot/):
+    python -m benchmarks.bench_recurring --rows 100000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from src.financIA.core.archive import TransactionArchive
+from src.financIA.core.database import DatabaseManager
+from src.financIA.core.recurring import RecurringDetector, detect
+
+
+def generate(rows: int, merchants: int, seed: int = 42):
+    """Mistura assinaturas mensais/semanais/anuais com gastos aleatórios"""
+    rnd = np.random.default_rng(seed)
+    start = 18000
+    parts_days, parts_amounts, parts_keys = [], [], []
+
+    # Um terço dos merchants é periódico
+    periodic = merchants // 3
+    for key in range(periodic):
+        period = (7, 30, 365)[key % 3]
+        occurrences = max(2, 5 * 365 // period)
+        days = start + np.arange(occurrences) * period + rnd.integers(-1, 2, occurrences)
+        amount = -int(rnd.integers(1000, 20000))
+        parts_days.append(days)
+        parts_amounts.append(np.full(occurrences, amount))
+        parts_keys.append(np.full(occurrences, key))
+
+    used = sum(len(d) for d in parts_days)
+    remaining = max(rows - used, 0)
+    parts_days.append(start + rnd.integers(0, 5 * 365, remaining))
+    parts_amounts.append(-rnd.integers(100, 50000, remaining))
+    parts_keys.append(rnd.integers(periodic, merchants, remaining))
+
+    return (np.concatenate(parts_days).astype(np.int64),
+            np.concatenate(parts_amounts).astype(np.int64),
+            np.concatenate(parts_keys).astype(np.int64))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark da detecção de recorrências")
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--merchants', type=int, default=3000)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    days, amounts, keys = generate(args.rows, args.merchants)
+    detect(days, amounts, keys)  # aquecimento
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        result = detect(days, amounts, keys)
+    elapsed = (time.perf_counter() - start) / args.repeat * 1000
+
+    print(f"{len(days)} linhas, {args.merchants} merchants")
+    print(f"detect(): {elapsed:.1f} ms")
+    print(f"recorrentes: {int((result['period'] > 0).sum())} "
+          f"(esperado ~{args.merchants // 3}), anomalias: {int(result['outliers'].sum())}")
+
+    # Ponta a ponta: leitura do SQLite + detecção + gravação dos padrões
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(os.path.join(tmp, 'bench.db'))
+        with db._get_connection() as conn:
+            conn.executemany('INSERT INTO merchants (id, name) VALUES (?, ?)',
+                             ((int(k), f"M{k}") for k in np.unique(keys)))
+            conn.commit()
+        with db._get_connection(1) as conn:
+            conn.executemany('''
+                INSERT INTO transactions (user_id, date, description, amount, merchant_id)
+                VALUES (1, ?, '', ?, ?)
+            ''', zip(days.tolist(), amounts.tolist(), keys.tolist()))
+            conn.commit()
+        detector = RecurringDetector(db, TransactionArchive(db, os.path.join(tmp, 'archive')))
+
+        start = time.perf_counter()
+        detector.scan(1)
+        print(f"scan() completo: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        sample = [{'merchant_id': int(k), 'date': 0, 'amount': -1} for k in keys[:20]]
+        start = time.perf_counter()
+        detector.update(1, sample)
+        print(f"update() com 20 transações: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Importações simultâneas de usuários diferentes: arquivo único vs shards.
+
+Cada thread importa os extratos de um usuário por
+AnalysisService._process_transactions, o mesmo caminho do bot: filtro de linhas
+já vistas, resolução de merchants (lock do índice e escrita no banco
+principal só para descrições nunca vistas), categorização, gravação com as
+impressões digitais e atualização das recorrências. Cerca de 10% das linhas
+de cada extrato são PIX para nomes novos, então toda importação passa uma
+vez pelo catálogo. `--fsync-ms` acrescenta a cada commit a latência de flush de um disco real,
+com o lock de escrita do arquivo ainda preso (em tmpfs/cache o fsync é ~0).
+
+Uso (a partir de financIA-bot/):
+    python -m benchmarks.bench_shards --users 16 --imports 20 --rows 200 --fsync-ms 2
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+from src.financIA.core.archive import TransactionArchive
+from src.financIA.core.database import DatabaseManager
+from src.financIA.core.records import TransactionRecord
+from src.financIA.utils.upload_store import UploadStore
+from src.services.analysis_service import AnalysisService
+
+
+class SlowDiskConnection(sqlite3.Connection):
+    delay = 0.0
+
+    def commit(self):
+        if self.in_transaction and self.delay:
+            time.sleep(self.delay)
+        super().commit()
+
+
+class SlowDiskDatabase(DatabaseManager):
+    connection_class = SlowDiskConnection
+
+
+WORDS = ('MERCADO', 'POSTO', 'FARMACIA', 'PADARIA', 'RESTAURANTE', 'LOJA', 'PET', 'BAR')
+
+
+def statement(user_id: int, number: int, rows: int):
+    """Mistura merchants comuns a todos os usuários com alguns próprios de cada extrato"""
+    rnd = random.Random(user_id * 100003 + number)
+    records = []
+    for _ in range(rows):
+        if rnd.random() < 0.9:
+            name = f"{rnd.choice(WORDS)} {rnd.randrange(300):03d}X"
+        else:
+            name = f"PIX ENVIADO {''.join(rnd.choice('ABCDEFGHIJLMNOPRSTUV') for _ in range(8))}"
+        records.append(TransactionRecord(
+            date=19000 + number * 30 + rnd.randrange(30),
+            description=f"COMPRA CARTAO {name} *{rnd.randrange(9999)}",
+            amount=-rnd.randrange(100, 50000),
+            source='file'
+        ))
+    return records
+
+
+def run(db: DatabaseManager, analysis: AnalysisService, users: int, imports: int, rows: int):
+    barrier = threading.Barrier(users)
+    latencies, errors = [], []
+
+    def worker(user_id: int):
+        batches = [statement(user_id, n, rows) for n in range(imports)]
+        barrier.wait()
+        try:
+            for batch in batches:
+                start = time.perf_counter()
+                analysis._process_transactions(batch, user_id)
+                db.get_balance(user_id)
+                latencies.append(time.perf_counter() - start)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(user_id,)) for user_id in range(1, users + 1)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    if errors:
+        raise errors[0]
+    return elapsed, latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark de importações simultâneas por shard")
+    parser.add_argument('--users', type=int, default=16)
+    parser.add_argument('--imports', type=int, default=20, help="Importações por usuário")
+    parser.add_argument('--rows', type=int, default=200, help="Linhas por extrato")
+    parser.add_argument('--shards', type=int, default=8)
+    parser.add_argument('--fsync-ms', type=float, default=2.0, help="Latência simulada de cada commit")
+    args = parser.parse_args()
+
+    SlowDiskConnection.delay = args.fsync_ms / 1000
+    total = args.users * args.imports * args.rows
+    print(f"{args.users} usuários x {args.imports} importações x {args.rows} linhas, "
+          f"commit +{args.fsync_ms} ms")
+    for mode in ('single', 'hash', 'user'):
+        with tempfile.TemporaryDirectory() as tmp:
+            db = SlowDiskDatabase(os.path.join(tmp, 'bench.db'), shard_mode=mode, shards=args.shards)
+            archive = TransactionArchive(db, os.path.join(tmp, 'archive'))
+            analysis = AnalysisService(db, None, archive, UploadStore(db, os.path.join(tmp, 'uploads')))
+            elapsed, latencies = run(db, analysis, args.users, args.imports, args.rows)
+            stored = sum(r['transactions'] for r in db.get_shard_stats())
+            assert stored == total, f"{stored} != {total}"
+            p95 = statistics.quantiles(latencies, n=20)[-1]
+            label = f"hash ({args.shards} shards)" if mode == 'hash' else mode
+            print(f"{label:<16} {elapsed * 1000:7.0f} ms  {total / elapsed:8.0f} linhas/s  "
+                  f"importação p50 {statistics.median(latencies) * 1000:6.1f} ms  p95 {p95 * 1000:6.1f} ms  "
+                  f"arquivos: {len(db.shard_paths())}")
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
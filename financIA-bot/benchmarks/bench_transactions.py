@@ -0,0 +1,133 @@
+"""
+Compara consultas de intervalo e agregação mensal entre o esquema legado
+(amount REAL, date TEXT) e o esquema tipado (centavos e número de dias).
+
+Uso (a partir de financIA-bot/):
+    python -m benchmarks.bench_transactions --rows 200000 --users 50
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import date, timedelta
+
+from src.financIA.core import migrations
+from src.financIA.core.records import to_day_number
+
+LEGACY_SCHEMA = """
+    CREATE TABLE transactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date TEXT NOT NULL,
+        description TEXT NOT NULL,
+        amount REAL NOT NULL,
+        category TEXT,
+        user_id INTEGER
+    )"""
+
+# Mesmo índice do esquema tipado, para comparar só o tipo das colunas
+LEGACY_INDEX = "CREATE INDEX idx_legacy_user_date ON transactions (user_id, date)"
+
+# Datas legadas chegam em ISO (Open Finance) ou dd/mm/aaaa (extratos)
+LEGACY_DATE_SQL = """
+    CASE WHEN substr(date, 3, 1) = '/'
+         THEN substr(date, 7, 4) || '-' || substr(date, 4, 2) || '-' || substr(date, 1, 2)
+         ELSE date END"""
+
+
+def generate_rows(rows: int, users: int):
+    start = date(2020, 1, 1)
+    rnd = random.Random(42)
+    for _ in range(rows):
+        day = start + timedelta(days=rnd.randrange(5 * 365))
+        amount = round(rnd.uniform(-500, 500), 2)
+        text_date = day.isoformat() if rnd.random() < 0.5 else day.strftime('%d/%m/%Y')
+        yield text_date, 'COMPRA CARTAO', amount, 'Outros', rnd.randrange(users)
+
+
+def build_legacy(path: str, rows: int, users: int) -> None:
+    conn = sqlite3.connect(path)
+    conn.execute(LEGACY_SCHEMA)
+    conn.executemany(
+        "INSERT INTO transactions (date, description, amount, category, user_id) VALUES (?, ?, ?, ?, ?)",
+        generate_rows(rows, users)
+    )
+    conn.execute(LEGACY_INDEX)
+    conn.commit()
+    conn.close()
+
+
+def timed(conn: sqlite3.Connection, sql: str, params, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        conn.execute(sql, params).fetchall()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def run(rows: int, users: int, repeat: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, 'legacy.db')
+        typed_path = os.path.join(tmp, 'typed.db')
+        build_legacy(legacy_path, rows, users)
+        build_legacy(typed_path, rows, users)
+
+        start = time.perf_counter()
+        stats = migrations.migrate_file(typed_path, backup=False)
+        migration_ms = (time.perf_counter() - start) * 1000
+
+        legacy = sqlite3.connect(legacy_path)
+        typed = sqlite3.connect(typed_path)
+        user_id = users // 2
+
+        results = {
+            'intervalo (1 mês)': (
+                timed(legacy, f"""
+                    SELECT date, description, amount FROM transactions
+                    WHERE user_id = ? AND {LEGACY_DATE_SQL} BETWEEN ? AND ?
+                    ORDER BY {LEGACY_DATE_SQL}""",
+                    (user_id, '2022-03-01', '2022-03-31'), repeat),
+                timed(typed, """
+                    SELECT date, description, amount FROM transactions
+                    WHERE user_id = ? AND date BETWEEN ? AND ?
+                    ORDER BY date""",
+                    (user_id, to_day_number('2022-03-01'), to_day_number('2022-03-31')), repeat)
+            ),
+            'total por mês': (
+                timed(legacy, f"""
+                    SELECT substr({LEGACY_DATE_SQL}, 1, 7) AS month, SUM(amount)
+                    FROM transactions WHERE user_id = ?
+                    GROUP BY month""", (user_id,), repeat),
+                timed(typed, """
+                    SELECT strftime('%Y%m', date * 86400, 'unixepoch') AS month, SUM(amount)
+                    FROM transactions WHERE user_id = ?
+                    GROUP BY month""", (user_id,), repeat)
+            ),
+            'saldo': (
+                timed(legacy, "SELECT SUM(amount) FROM transactions WHERE user_id = ?", (user_id,), repeat),
+                timed(typed, "SELECT SUM(amount) FROM transactions WHERE user_id = ?", (user_id,), repeat)
+            ),
+        }
+        legacy.close()
+        typed.close()
+
+        print(f"{rows} linhas, {users} usuários, média de {repeat} execuções")
+        print(f"Migração: {migration_ms:.0f} ms ({stats['migrated']} linhas)")
+        print(f"Tamanho: legado {os.path.getsize(legacy_path) / 1024:.0f} KB, "
+              f"tipado {os.path.getsize(typed_path) / 1024:.0f} KB")
+        print(f"{'consulta':<20}{'legado (ms)':>14}{'tipado (ms)':>14}")
+        for name, (before, after) in results.items():
+            print(f"{name:<20}{before:>14.2f}{after:>14.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark do esquema de transações")
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    run(args.rows, args.users, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,7 +8,10 @@ from telegram.ext import (
     filters
 )
 from src.financIA.core.database import DatabaseManager
+from src.financIA.core.archive import TransactionArchive
+from src.financIA.utils.upload_store import UploadStore
 from src.financIA.bot.handlers import BotHandlers
+from src.financIA.bot.outbox import OutboundQueue
 from src.financIA.config import Config
 from src.integrations.open_finance import OpenFinanceIntegration
 from src.services.analysis_service import AnalysisService
@@ -28,8 +31,21 @@ async def post_init(application: Application) -> None:
         ('extrato', "Mostra últimas transações"),
         ('conectar_openfinance', "Conecta ao Open Finance"),
         ('sincronizar', "Sincroniza dados com Open Finance"),
-        ('enviar_extrato', "Envia extrato bancário")
+        ('enviar_extrato', "Envia extrato bancário"),
+        ('resumo', "Entradas e saídas por mês"),
+        ('gastos', "Maiores gastos por estabelecimento"),
+        ('recorrentes', "Cobranças recorrentes"),
+        ('exportar', "Exporta seu histórico (CSV ou Parquet)")
     ])
+    await application.bot_data['outbox'].start()
+
+async def post_shutdown(application: Application) -> None:
+    """Encerra a fila de saída, grava categorias pendentes e fecha o banco"""
+    outbox = application.bot_data['outbox']
+    logger.info(f"Fila de saída: {outbox.stats()}")
+    await outbox.stop()
+    application.bot_data['merchants'].flush()
+    application.bot_data['db'].close()
 
 def setup_handlers(application: Application, handlers: BotHandlers) -> None:
     """Configura todos os handlers do bot"""
@@ -40,7 +56,11 @@ def setup_handlers(application: Application, handlers: BotHandlers) -> None:
         CommandHandler("extrato", handlers.handle_statement),
         CommandHandler("conectar_openfinance", handlers.handle_open_finance_connect),
         CommandHandler("sincronizar", handlers.handle_open_finance_sync),
-        CommandHandler("enviar_extrato", handlers.initiate_file_upload)
+        CommandHandler("enviar_extrato", handlers.initiate_file_upload),
+        CommandHandler("resumo", handlers.handle_summary),
+        CommandHandler("gastos", handlers.handle_top_merchants),
+        CommandHandler("recorrentes", handlers.handle_recurring),
+        CommandHandler("exportar", handlers.handle_export)
     ]
     
     # Handlers para botões inline
@@ -80,15 +100,25 @@ def main() -> None:
                 Config.OPEN_FINANCE_REDIRECT_URI
             )
         
-        analysis_service = AnalysisService(db_manager, of_client)
-        bot_handlers = BotHandlers(db_manager, analysis_service)
+        archive = TransactionArchive(db_manager)
+        uploads = UploadStore(db_manager)
+        analysis_service = AnalysisService(db_manager, of_client, archive, uploads)
         
         # Cria e configura a aplicação
         application = Application.builder() \
             .token(Config.BOT_TOKEN) \
             .post_init(post_init) \
+            .post_shutdown(post_shutdown) \
+            .concurrent_updates(True) \
             .build()
         
+        # Todos os envios passam pela fila com limites do Telegram
+        outbox = OutboundQueue(application.bot)
+        application.bot_data['outbox'] = outbox
+        application.bot_data['db'] = db_manager
+        application.bot_data['merchants'] = analysis_service.merchants
+        bot_handlers = BotHandlers(db_manager, analysis_service, archive, uploads, outbox)
+        
         setup_handlers(application, bot_handlers)
         
         logger.info("Bot iniciado. Pressione Ctrl+C para sair.")
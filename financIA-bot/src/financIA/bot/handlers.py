@@ -2,23 +2,34 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CallbackContext, MessageHandler, filters
 from pathlib import Path
 from datetime import datetime
+import asyncio
 import tempfile
 import logging
 from typing import Dict, Any
 import pandas as pd
 
 from ..core.database import DatabaseManager
+from ..core.archive import TransactionArchive
+from ..core.records import format_day, to_day_number
 from ..services.analysis_service import AnalysisService
 from ..file_parsers.bank_parser import BankParserFactory
 from ..utils.file_validation import validate_bank_statement
+from ..utils.upload_store import UploadStore
+from .outbox import OutboundQueue
 from ..config import Config
 
 logger = logging.getLogger(__name__)
 
+PERIOD_NAMES = {7: 'semanal', 30: 'mensal', 365: 'anual'}
+
 class BotHandlers:
-    def __init__(self, db: DatabaseManager, analysis: AnalysisService):
+    def __init__(self, db: DatabaseManager, analysis: AnalysisService, archive: TransactionArchive = None,
+                 uploads: UploadStore = None, outbox: OutboundQueue = None):
         self.db = db
         self.analysis = analysis
+        self.archive = archive or TransactionArchive(db)
+        self.uploads = uploads or UploadStore(db)
+        self.outbox = outbox
     
     async def start(self, update: Update, context: CallbackContext) -> None:
         """Menu principal com todas as opções"""
@@ -31,7 +42,8 @@ class BotHandlers:
             [InlineKeyboardButton("📤 Enviar Extrato", callback_data='upload_file')]
         ]
         
-        await update.message.reply_text(
+        await self._reply(
+            update,
             f"👋 Olá {user.first_name}! Eu sou seu assistente financeiro.\n\n"
             "Você pode:\n"
             "- Ver seu saldo e extrato\n"
@@ -43,9 +55,10 @@ class BotHandlers:
     async def handle_balance(self, update: Update, context: CallbackContext) -> None:
         """Handler para saldo"""
         user_id = update.effective_user.id
-        balance = self.db.get_balance(user_id)
+        balance = self.archive.get_balance(user_id)
         
-        await update.message.reply_text(
+        await self._reply(
+            update,
             f"📊 Seu saldo atual é: R$ {balance:.2f}\n\n"
             f"Atualizado em: {datetime.now().strftime('%d/%m/%Y %H:%M')}"
         )
@@ -53,13 +66,88 @@ class BotHandlers:
     async def handle_statement(self, update: Update, context: CallbackContext) -> None:
         """Handler para extrato"""
         user_id = update.effective_user.id
-        transactions = self.db.get_last_transactions(user_id, limit=5)
+        transactions = self.archive.get_last_transactions(user_id, limit=5)
         
         response = "📋 Últimas transações:\n"
         for t in transactions:
             response += f"\n• {t['date']}: {t['description']} - R$ {t['amount']:.2f} ({t['category']})"
         
-        await update.message.reply_text(response)
+        await self._reply(update, response)
+    
+    async def handle_summary(self, update: Update, context: CallbackContext) -> None:
+        """Entradas e saídas dos últimos meses (/resumo), incluindo meses arquivados"""
+        months = await asyncio.to_thread(self.analysis.monthly_summary, update.effective_user.id)
+        if not months:
+            await self._reply(update, "Nenhuma transação registrada ainda.")
+            return
+
+        response = "📅 Resumo mensal:\n"
+        for m in months[-6:]:
+            response += (
+                f"\n• {m['month'] % 100:02d}/{m['month'] // 100}: "
+                f"entradas R$ {m['income']:.2f}, saídas R$ {abs(m['expenses']):.2f}, "
+                f"saldo R$ {m['net']:.2f}"
+            )
+        await self._reply(update, response)
+
+    async def handle_top_merchants(self, update: Update, context: CallbackContext) -> None:
+        """Maiores gastos por estabelecimento nos últimos 30 dias (/gastos)"""
+        today = to_day_number(datetime.now())
+        merchants = await asyncio.to_thread(
+            self.analysis.top_merchants, update.effective_user.id, today - 30, today, 5
+        )
+        if not merchants:
+            await self._reply(update, "Nenhum gasto nos últimos 30 dias.")
+            return
+
+        response = "🏪 Maiores gastos (30 dias):\n"
+        for m in merchants:
+            response += f"\n• {m['name']}: R$ {m['total']:.2f} ({m['count']}x)"
+        await self._reply(update, response)
+
+    async def handle_recurring(self, update: Update, context: CallbackContext) -> None:
+        """Cobranças recorrentes conhecidas (/recorrentes)"""
+        patterns = self.analysis.recurring_charges(update.effective_user.id)
+        if not patterns:
+            await self._reply(update, "Nenhuma cobrança recorrente encontrada.")
+            return
+
+        response = "🔁 Cobranças recorrentes:\n"
+        for p in patterns:
+            period = PERIOD_NAMES.get(p['period_days'], f"a cada {p['period_days']} dias")
+            response += (
+                f"\n• {p['name']}: R$ {abs(p['amount']) / 100:.2f} ({period}), "
+                f"próxima em {format_day(p['next_day'])}"
+            )
+        await self._reply(update, response)
+
+    async def handle_export(self, update: Update, context: CallbackContext) -> None:
+        """Exporta o histórico completo (/exportar [csv|parquet])"""
+        user_id = update.effective_user.id
+        fmt = (context.args[0].lower() if context.args else 'csv')
+        if fmt not in ('csv', 'parquet'):
+            await self._reply(update, "Uso: /exportar csv ou /exportar parquet")
+            return
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_path = Path(tmp_dir) / f"historico_{user_id}.{fmt}"
+            try:
+                # Em thread: uma exportação grande não trava os outros chats
+                count = await asyncio.to_thread(self.archive.export, user_id, str(output_path), fmt)
+            except Exception as e:
+                logger.error(f"Erro na exportação: {str(e)}", exc_info=True)
+                await self._reply(update, "❌ Não foi possível exportar seu histórico.")
+                return
+
+            if not count:
+                await self._reply(update, "Nenhuma transação para exportar.")
+                return
+
+            await self._reply_document(
+                update, output_path,
+                filename=output_path.name,
+                caption=f"📦 {count} transações exportadas"
+            )
     
     async def handle_message(self, update: Update, context: CallbackContext) -> None:
         """Handler para mensagens não-comando"""
@@ -68,7 +156,7 @@ class BotHandlers:
         elif context.user_data.get('awaiting_file_upload'):
             await self.handle_file_upload(update, context)
         else:
-            await update.message.reply_text("Por favor use os botões do menu:")
+            await self._reply(update, "Por favor use os botões do menu:")
             await self.start(update, context)
     
     # --- Open Finance Handlers ---
@@ -121,7 +209,8 @@ class BotHandlers:
                 refresh_token=account_info['refresh_token']
             )
             
-            await update.message.reply_text(
+            await self._reply(
+                update,
                 "✅ Banco conectado com sucesso!\n\n"
                 f"Banco: {account_info['institution']}\n"
                 f"Conta: {account_info['account_number']}\n\n"
@@ -130,7 +219,8 @@ class BotHandlers:
             
         except Exception as e:
             logger.error(f"Erro na conexão Open Finance: {str(e)}")
-            await update.message.reply_text(
+            await self._reply(
+                update,
                 f"❌ Falha na conexão: {str(e)}\n\n"
                 "Por favor tente novamente ou contate o suporte."
             )
@@ -143,7 +233,8 @@ class BotHandlers:
         connection = self.db.get_of_connection(user_id)
         
         if not connection:
-            await update.message.reply_text(
+            await self._reply(
+                update,
                 "⚠️ Nenhum banco conectado.\n"
                 "Use /conectar_openfinance primeiro."
             )
@@ -151,8 +242,11 @@ class BotHandlers:
         
         try:
             last_sync = self.db.get_last_sync_date(user_id)
-            count = self.analysis.process_source(
+            # Em thread: importações de outros usuários seguem em paralelo
+            count = await asyncio.to_thread(
+                self.analysis.process_source,
                 source_type='open_finance',
+                user_id=user_id,
                 account_id=connection['account_id'],
                 start_date=last_sync or '2023-01-01',
                 end_date=datetime.now().strftime('%Y-%m-%d')
@@ -160,15 +254,18 @@ class BotHandlers:
             
             self.db.update_last_sync(user_id)
             
-            await update.message.reply_text(
+            await self._reply(
+                update,
                 f"🔄 Sincronização concluída!\n"
                 f"• {count} novas transações\n"
-                f"• Saldo atual: R$ {self.db.get_balance(user_id):.2f}"
+                f"• Saldo atual: R$ {self.archive.get_balance(user_id):.2f}"
             )
+            await self._notify_findings(update, user_id)
             
         except Exception as e:
             logger.error(f"Erro na sincronização: {str(e)}")
-            await update.message.reply_text(
+            await self._reply(
+                update,
                 f"❌ Falha na sincronização: {str(e)}\n\n"
                 "Tentando novamente em 5 minutos..."
             )
@@ -213,7 +310,7 @@ class BotHandlers:
     async def handle_file_upload(self, update: Update, context: CallbackContext) -> None:
         """Processa arquivos bancários enviados"""
         if not context.user_data.get('awaiting_file_upload'):
-            await update.message.reply_text("Por favor inicie o upload usando o botão no menu.")
+            await self._reply(update, "Por favor inicie o upload usando o botão no menu.")
             return
         
         user = update.effective_user
@@ -221,48 +318,117 @@ class BotHandlers:
         
         # Verifica tamanho do arquivo (max 5MB)
         if document.file_size > 5 * 1024 * 1024:
-            await update.message.reply_text("❌ Arquivo muito grande. Tamanho máximo: 5MB")
+            await self._reply(update, "❌ Arquivo muito grande. Tamanho máximo: 5MB")
             return
         
         file_ext = Path(document.file_name).suffix.lower()
         if file_ext not in ['.csv', '.xlsx', '.xls']:
-            await update.message.reply_text("❌ Formato não suportado. Envie CSV ou Excel.")
+            await self._reply(update, "❌ Formato não suportado. Envie CSV ou Excel.")
             return
         
         try:
-            # Cria diretório para uploads do usuário
-            user_dir = Path(Config.UPLOADS_DIR) / str(user.id)
-            user_dir.mkdir(parents=True, exist_ok=True)
+            # Mesmo arquivo do Telegram: responde sem baixar
+            previous = self.uploads.find_by_file_unique_id(user.id, document.file_unique_id)
+            if previous:
+                await self._reply_duplicate_upload(update, previous)
+                return
             
-            # Faz download do arquivo
-            file_path = user_dir / f"extrato_{datetime.now().strftime('%Y%m%d_%H%M%S')}{file_ext}"
+            # Faz download do arquivo e o guarda pelo hash do conteúdo
+            staged_path = self.uploads.staging_path(user.id, file_ext)
             file = await document.get_file()
-            await file.download_to_drive(file_path)
+            await file.download_to_drive(staged_path)
+            sha256, file_path = self.uploads.store(user.id, staged_path)
+            
+            previous = self.uploads.find_by_hash(user.id, sha256)
+            if previous:
+                self.uploads.remember_file_id(user.id, sha256, document.file_unique_id)
+                await self._reply_duplicate_upload(update, previous)
+                return
             
-            # Processa o arquivo
+            # Processa o arquivo (apenas linhas ainda não importadas)
             bank_type = validate_bank_statement(file_path)
-            transactions = self.analysis.process_file(file_path, bank_type)
+            result = await asyncio.to_thread(self.analysis.process_file, file_path, bank_type, user.id)
+            self.uploads.register(
+                user.id, sha256, document.file_unique_id, file_path,
+                bank_type.value, result['total_rows'], result['imported_rows']
+            )
+            self.uploads.enforce_retention(user.id)
             
-            await update.message.reply_text(
+            skipped = result['total_rows'] - result['imported_rows']
+            await self._reply(
+                update,
                 f"✅ Extrato processado com sucesso!\n\n"
                 f"• Banco: {bank_type.value}\n"
-                f"• Transações importadas: {len(transactions)}\n"
-                f"• Saldo atualizado: R$ {self.db.get_balance(user.id):.2f}",
+                f"• Transações importadas: {result['imported_rows']}\n"
+                + (f"• Já importadas antes: {skipped}\n" if skipped else "")
+                + f"• Saldo atualizado: R$ {self.archive.get_balance(user.id):.2f}",
                 reply_markup=InlineKeyboardMarkup([
                     [InlineKeyboardButton("📋 Ver Extrato", callback_data='statement')]
                 ])
             )
+            await self._notify_findings(update, user.id)
             
         except ValueError as e:
-            await update.message.reply_text(f"❌ Erro no arquivo: {str(e)}")
+            await self._reply(update, f"❌ Erro no arquivo: {str(e)}")
         except Exception as e:
             logger.error(f"Erro ao processar arquivo: {str(e)}", exc_info=True)
-            await update.message.reply_text("❌ Ocorreu um erro ao processar seu arquivo.")
+            await self._reply(update, "❌ Ocorreu um erro ao processar seu arquivo.")
         finally:
             context.user_data.pop('awaiting_file_upload', None)
     
     # --- Helper Methods ---
     
+    async def _reply(self, update: Update, text: str, **kwargs):
+        """Resposta interativa, com prioridade na fila de saída"""
+        if self.outbox is None:
+            return await update.effective_message.reply_text(text, **kwargs)
+        return await self.outbox.send(update.effective_chat.id, text, **kwargs)
+    
+    async def _reply_document(self, update: Update, document: Path, **kwargs):
+        """Envia um arquivo pela fila de saída (o caminho é relido a cada tentativa)"""
+        if self.outbox is None:
+            return await update.effective_message.reply_document(document=document, **kwargs)
+        return await self.outbox.send_document(update.effective_chat.id, document, **kwargs)
+
+    async def _notify(self, update: Update, text: str) -> None:
+        """Aviso em segundo plano; avisos pendentes do mesmo chat são agrupados"""
+        if self.outbox is None:
+            await update.effective_message.reply_text(text)
+            return
+        self.outbox.notify(update.effective_chat.id, text)
+    
+    async def _reply_duplicate_upload(self, update: Update, previous: Dict[str, Any]) -> None:
+        """Responde com o resultado da importação anterior do mesmo extrato"""
+        imported_at = datetime.fromtimestamp(previous['created_at']).strftime('%d/%m/%Y %H:%M')
+        await self._reply(
+            update,
+            f"♻️ Este extrato já foi importado em {imported_at}.\n\n"
+            f"• Banco: {previous['bank']}\n"
+            f"• Transações importadas: {previous['imported_rows']}\n"
+            f"• Saldo atual: R$ {self.archive.get_balance(update.effective_user.id):.2f}",
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("📋 Ver Extrato", callback_data='statement')]
+            ])
+        )
+    
+    async def _notify_findings(self, update: Update, user_id: int) -> None:
+        """Avisa sobre novas cobranças recorrentes e valores fora do padrão"""
+        findings = self.analysis.pop_findings(user_id)
+        lines = []
+        for p in findings['recurring']:
+            period = PERIOD_NAMES.get(p['period_days'], f"a cada {p['period_days']} dias")
+            lines.append(
+                f"🔁 {p['name']}: R$ {abs(p['amount']) / 100:.2f} ({period}), "
+                f"próxima em {format_day(p['next_day'])}"
+            )
+        for a in findings['anomalies']:
+            lines.append(
+                f"⚠️ {a['name']} em {format_day(a['date'])}: R$ {abs(a['amount']) / 100:.2f} "
+                f"(normalmente R$ {abs(a['expected']) / 100:.2f})"
+            )
+        if lines:
+            await self._notify(update, "🔎 Padrões encontrados:\n\n" + "\n".join(lines))
+    
     def _exchange_token(self, auth_code: str) -> Dict[str, Any]:
         """Implementação real da troca de tokens OAuth2"""
         response = requests.post(
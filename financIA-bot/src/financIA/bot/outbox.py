@@ -0,0 +1,316 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Dict, Optional, Set
+
+from telegram import Bot, Message
+from telegram.error import RetryAfter
+
+from ..config import Config
+
+logger = logging.getLogger(__name__)
+
+# Limite de tamanho de mensagem do Telegram
+MAX_MESSAGE_LENGTH = 4096
+
+# Separador entre avisos agrupados na mesma mensagem
+COALESCE_SEPARATOR = "\n\n"
+
+
+class TokenBucket:
+    """Balde de fichas: `rate` envios por segundo, rajadas de até `capacity`"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Segundos até haver uma ficha disponível (0 se já houver)"""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class _Outgoing:
+    __slots__ = ('chat_id', 'texts', 'kwargs', 'future', 'enqueued_at', 'method')
+
+    def __init__(self, chat_id: int, text: str, kwargs: Dict[str, Any], future: Optional[asyncio.Future],
+                 method: str = 'send_message'):
+        self.chat_id = chat_id
+        self.texts = [text]
+        self.kwargs = kwargs
+        self.future = future
+        self.enqueued_at = time.monotonic()
+        self.method = method
+
+
+class OutboundQueue:
+    """
+    Fila única de envio do bot.
+    - Respostas interativas têm prioridade sobre avisos em segundo plano
+    - Limites por balde de fichas: global e por chat
+    - Avisos pendentes para o mesmo chat são agrupados numa só mensagem
+    - 429 (RetryAfter) pausa a fila pelo tempo pedido pelo Telegram
+    - Até `max_in_flight` envios simultâneos, no máximo um por chat (mantém a ordem)
+    """
+
+    def __init__(self, bot: Bot, global_rate: float = None, chat_rate: float = None,
+                 chat_burst: float = None, max_in_flight: int = None):
+        self.bot = bot
+        self.global_bucket = TokenBucket(global_rate or Config.OUTBOX_GLOBAL_RATE,
+                                         global_rate or Config.OUTBOX_GLOBAL_RATE)
+        self.chat_rate = chat_rate or Config.OUTBOX_CHAT_RATE
+        self.chat_burst = chat_burst or Config.OUTBOX_CHAT_BURST
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+        self._interactive: deque = deque()
+        self._background: Dict[int, _Outgoing] = {}
+        self._paused_until = 0.0
+        self._wakeup = asyncio.Event()
+        self._worker: Optional[asyncio.Task] = None
+        self._slots = asyncio.Semaphore(max_in_flight or Config.OUTBOX_MAX_IN_FLIGHT)
+        self._in_flight: Set[asyncio.Task] = set()
+        self._busy_chats: Set[int] = set()
+        self._metrics = {
+            'sent': 0,
+            'coalesced': 0,
+            'rate_limited': 0,
+            'failed': 0,
+            'lag_avg': 0.0,
+            'lag_max': 0.0,
+        }
+
+    # --- API ---
+
+    async def send(self, chat_id: int, text: str, **kwargs) -> Message:
+        """Envia uma resposta interativa e aguarda a entrega"""
+        if self._worker is None:
+            return await self.bot.send_message(chat_id=chat_id, text=text, **kwargs)
+        future = asyncio.get_running_loop().create_future()
+        self._interactive.append(_Outgoing(chat_id, text, kwargs, future))
+        self._wakeup.set()
+        return await future
+
+    async def send_document(self, chat_id: int, document: Any, **kwargs) -> Message:
+        """Envia um arquivo como resposta interativa (mesmos limites das mensagens)"""
+        if self._worker is None:
+            return await self.bot.send_document(chat_id=chat_id, document=document, **kwargs)
+        future = asyncio.get_running_loop().create_future()
+        self._interactive.append(_Outgoing(chat_id, '', {'document': document, **kwargs}, future,
+                                           method='send_document'))
+        self._wakeup.set()
+        return await future
+
+    def notify(self, chat_id: int, text: str) -> None:
+        """Enfileira um aviso em segundo plano, agrupando com outros pendentes do chat"""
+        pending = self._background.get(chat_id)
+        if pending is not None:
+            pending.texts.append(text)
+            self._metrics['coalesced'] += 1
+        else:
+            self._background[chat_id] = _Outgoing(chat_id, text, {}, None)
+        self._wakeup.set()
+
+    def stats(self) -> Dict[str, float]:
+        """Métricas da fila (atraso em segundos entre enfileirar e enviar)"""
+        now = time.monotonic()
+        pending = list(self._interactive) + list(self._background.values())
+        return {
+            **self._metrics,
+            'interactive_queued': len(self._interactive),
+            'background_queued': len(self._background),
+            'oldest_pending': max((now - m.enqueued_at for m in pending), default=0.0),
+        }
+
+    async def start(self) -> None:
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Encerra o worker; avisos pendentes são descartados"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        for task in list(self._in_flight):
+            task.cancel()
+        await asyncio.gather(*self._in_flight, return_exceptions=True)
+        for message in self._interactive:
+            if not message.future.done():
+                message.future.cancel()
+        self._interactive.clear()
+        self._background.clear()
+
+    # --- Worker ---
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _next_ready(self, now: float):
+        """Próxima mensagem que pode sair agora, ou o tempo de espera"""
+        wait = max(self._paused_until - now, self.global_bucket.delay(now))
+        if wait > 0:
+            return None, wait
+
+        # Chats com envio em andamento esperam o fim dele (ver _delivered)
+        waits = []
+        for message in self._interactive:
+            if message.chat_id in self._busy_chats:
+                continue
+            chat_wait = self._chat_bucket(message.chat_id).delay(now)
+            if chat_wait == 0:
+                self._interactive.remove(message)
+                return message, 0.0
+            waits.append(chat_wait)
+        for chat_id, message in self._background.items():
+            if chat_id in self._busy_chats:
+                continue
+            chat_wait = self._chat_bucket(chat_id).delay(now)
+            if chat_wait == 0:
+                return self._take_background(message), 0.0
+            waits.append(chat_wait)
+        return None, (min(waits) if waits else None)
+
+    def _take_background(self, message: _Outgoing) -> _Outgoing:
+        """Retira do agrupamento o quanto cabe numa mensagem do Telegram"""
+        texts, size = [], 0
+        while message.texts:
+            extra = len(message.texts[0]) + (len(COALESCE_SEPARATOR) if texts else 0)
+            if texts and size + extra > MAX_MESSAGE_LENGTH:
+                break
+            texts.append(message.texts.pop(0))
+            size += extra
+        if not message.texts:
+            del self._background[message.chat_id]
+        chunk = _Outgoing(message.chat_id, COALESCE_SEPARATOR.join(texts)[:MAX_MESSAGE_LENGTH], {}, None)
+        chunk.enqueued_at = message.enqueued_at
+        return chunk
+
+    def _requeue(self, message: _Outgoing) -> None:
+        if message.future is not None:
+            self._interactive.appendleft(message)
+            return
+        pending = self._background.pop(message.chat_id, None)
+        if pending is not None:
+            message.texts.extend(pending.texts)
+        # Volta para o início da ordem de chats
+        self._background = {message.chat_id: message, **self._background}
+
+    async def _run(self) -> None:
+        while True:
+            await self._slots.acquire()
+            try:
+                message = await self._next_message()
+                self._dispatch(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # O worker não pode morrer: send() ficaria esperando para sempre
+                self._slots.release()
+                logger.exception("Erro inesperado na fila de saída")
+
+    async def _next_message(self) -> _Outgoing:
+        """Aguarda a próxima mensagem liberada pelos limites"""
+        while True:
+            now = time.monotonic()
+            message, wait = self._next_ready(now)
+            if message is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            if message.future is not None and message.future.done():
+                # Quem aguardava a resposta desistiu (handler cancelado)
+                continue
+            return message
+
+    def _dispatch(self, message: _Outgoing) -> None:
+        """Consome as fichas e envia em uma tarefa própria, sem bloquear os outros chats"""
+        now = time.monotonic()
+        self.global_bucket.consume(now)
+        self._chat_bucket(message.chat_id).consume(now)
+        self._busy_chats.add(message.chat_id)
+        task = asyncio.create_task(self._deliver(message))
+        self._in_flight.add(task)
+        task.add_done_callback(lambda done: self._delivered(done, message))
+
+    def _delivered(self, task: asyncio.Task, message: _Outgoing) -> None:
+        """Libera o chat e a vaga de envio"""
+        self._in_flight.discard(task)
+        self._busy_chats.discard(message.chat_id)
+        self._slots.release()
+        self._wakeup.set()
+        self._prune_buckets()
+        if task.cancelled():
+            # Envio interrompido por stop()
+            if message.future is not None and not message.future.done():
+                message.future.cancel()
+        elif task.exception() is not None:
+            logger.error(f"Erro inesperado ao enviar para {message.chat_id}", exc_info=task.exception())
+
+    async def _deliver(self, message: _Outgoing) -> None:
+        try:
+            if message.method == 'send_document':
+                sent = await self.bot.send_document(chat_id=message.chat_id, **message.kwargs)
+            else:
+                sent = await self.bot.send_message(
+                    chat_id=message.chat_id, text=message.texts[0], **message.kwargs
+                )
+        except RetryAfter as e:
+            retry_after = e.retry_after
+            if hasattr(retry_after, 'total_seconds'):
+                retry_after = retry_after.total_seconds()
+            self._metrics['rate_limited'] += 1
+            self._paused_until = time.monotonic() + retry_after
+            logger.warning(f"Telegram pediu {retry_after}s de pausa (chat {message.chat_id})")
+            self._requeue(message)
+            return
+        except Exception as e:
+            self._metrics['failed'] += 1
+            if message.future is not None:
+                if not message.future.done():
+                    message.future.set_exception(e)
+            else:
+                logger.error(f"Falha ao enviar aviso para {message.chat_id}: {str(e)}")
+            return
+
+        lag = time.monotonic() - message.enqueued_at
+        self._metrics['sent'] += 1
+        self._metrics['lag_avg'] = 0.9 * self._metrics['lag_avg'] + 0.1 * lag
+        self._metrics['lag_max'] = max(self._metrics['lag_max'], lag)
+        if lag > Config.OUTBOX_LAG_WARNING:
+            logger.warning(f"Fila de saída atrasada: {lag:.1f}s para o chat {message.chat_id}")
+        if message.future is not None and not message.future.done():
+            message.future.set_result(sent)
+
+    def _prune_buckets(self) -> None:
+        """Descarta baldes cheios de chats inativos para não crescer sem limite"""
+        if len(self._chat_buckets) <= 10000:
+            return
+        now = time.monotonic()
+        active = {m.chat_id for m in self._interactive} | set(self._background) | self._busy_chats
+        self._chat_buckets = {
+            chat_id: bucket for chat_id, bucket in self._chat_buckets.items()
+            if chat_id in active or not bucket.is_full(now)
+        }
@@ -7,15 +7,30 @@ load_dotenv()
 class Config:
     BASE_DIR = Path(__file__).parent.parent
     DB_PATH = BASE_DIR / os.getenv("DATABASE_PATH", "data/processed/transactions.db")
+    DB_SHARD_MODE = os.getenv('DB_SHARD_MODE', 'single')  # single | hash | user
+    DB_SHARDS = int(os.getenv('DB_SHARDS', '16'))
+    DB_SHARD_DIR = BASE_DIR / os.getenv("DB_SHARD_PATH", "data/processed/shards")
+    DB_MAX_OPEN_SHARDS = int(os.getenv('DB_MAX_OPEN_SHARDS', '64'))
     BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
     OPEN_FINANCE_CLIENT_ID = os.getenv('OPEN_FINANCE_CLIENT_ID')
     OPEN_FINANCE_CLIENT_SECRET = os.getenv('OPEN_FINANCE_CLIENT_SECRET')
     OPEN_FINANCE_REDIRECT_URI = os.getenv('OPEN_FINANCE_REDIRECT_URI', 'https://seu.dominio/callback')
     UPLOADS_DIR = Path(__file__).parent.parent / "user_uploads"
+    UPLOAD_MAX_FILES_PER_USER = int(os.getenv('UPLOAD_MAX_FILES_PER_USER', '20'))
+    UPLOAD_RETENTION_DAYS = int(os.getenv('UPLOAD_RETENTION_DAYS', '90'))
+    OUTBOX_GLOBAL_RATE = float(os.getenv('OUTBOX_GLOBAL_RATE', '25'))
+    OUTBOX_CHAT_RATE = float(os.getenv('OUTBOX_CHAT_RATE', '1'))
+    OUTBOX_CHAT_BURST = float(os.getenv('OUTBOX_CHAT_BURST', '3'))
+    OUTBOX_LAG_WARNING = float(os.getenv('OUTBOX_LAG_WARNING', '10'))
+    OUTBOX_MAX_IN_FLIGHT = int(os.getenv('OUTBOX_MAX_IN_FLIGHT', '16'))
+    ARCHIVE_DIR = BASE_DIR / os.getenv("ARCHIVE_PATH", "data/archive")
     OPEN_FINANCE_TOKEN_URL = os.getenv('OPEN_FINANCE_TOKEN_URL', 'https://api.openfinance.example/oauth/token')
     
     @classmethod
     def ensure_dirs(cls):
         """Cria diretórios necessários"""
         cls.DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-        cls.UPLOADS_DIR.mkdir(parents=True, exist_ok=True)
\ No newline at end of file
+        if cls.DB_SHARD_MODE != 'single':
+            cls.DB_SHARD_DIR.mkdir(parents=True, exist_ok=True)
+        cls.UPLOADS_DIR.mkdir(parents=True, exist_ok=True)
+        cls.ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
\ No newline at end of file
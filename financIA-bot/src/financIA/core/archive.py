@@ -0,0 +1,370 @@
+"""
+Arquivo colunar (Parquet) do histórico de transações por usuário.
+
+Meses fechados saem do SQLite e vão para
+    <ARCHIVE_DIR>/<user_id>/<AAAAMM>.parquet
+e as consultas de extrato e análise leem as duas camadas.
+
+Uso:
+    python -m src.financIA.core.archive --keep-months 3
+"""
+import argparse
+import csv
+import logging
+import os
+from datetime import date
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+import numpy as np
+
+from src.financIA.config import Config
+from src.financIA.core.database import DatabaseManager, statement_line
+from src.financIA.core.records import (
+    TransactionRecord, format_day, from_cents, month_key, to_day_number
+)
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pc = pq = None
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ('id', 'user_id', 'date', 'description', 'amount', 'category', 'source', 'external_id',
+           'merchant_id')
+
+# Consultas e exportações processam o histórico em lotes deste tamanho
+BATCH_SIZE = 5000
+
+
+def _schema():
+    return pa.schema([
+        ('id', pa.int64()),
+        ('user_id', pa.int64()),
+        ('date', pa.date32()),      # date32 = dias desde 1970-01-01
+        ('description', pa.string()),
+        ('amount', pa.int64()),     # centavos
+        ('category', pa.string()),
+        ('source', pa.string()),
+        ('external_id', pa.string()),
+        ('merchant_id', pa.int64()),
+    ])
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError("pyarrow não instalado. Instale com: pip install 'financIA-bot[archive]'")
+
+
+def _to_table(rows: List[Dict]):
+    columns = {name: [r.get(name) for r in rows] for name in COLUMNS}
+    arrays = [pa.array(columns['date'], pa.int32()).cast(pa.date32()) if name == 'date'
+              else pa.array(columns[name], field.type)
+              for name, field in zip(COLUMNS, _schema())]
+    return pa.Table.from_arrays(arrays, schema=_schema())
+
+
+def _batch_to_rows(batch) -> List[TransactionRecord]:
+    table = pa.Table.from_batches([batch]) if isinstance(batch, pa.RecordBatch) else batch
+    index = table.schema.get_field_index('date')
+    days = table.column(index).cast(pa.int32())
+    return table.set_column(index, 'date', days).to_pylist()
+
+
+class TransactionArchive:
+    """Consulta unificada SQLite (meses recentes) + Parquet (meses fechados)"""
+
+    def __init__(self, db: DatabaseManager, archive_dir: str = None):
+        self.db = db
+        self.archive_dir = Path(archive_dir or Config.ARCHIVE_DIR)
+
+    # --- Arquivamento ---
+
+    def archive_closed_months(self, user_id: int, keep_months: int = 3) -> int:
+        """Move para Parquet os meses anteriores aos `keep_months` mais recentes"""
+        _require_pyarrow()
+        cutoff = self._cutoff_day(keep_months)
+
+        with self.db._get_connection(user_id) as conn:
+            # Mantém o lock de escrita até os arquivos estarem gravados
+            conn.execute("BEGIN IMMEDIATE")
+            rows = [dict(r) for r in conn.execute(f'''
+                SELECT {", ".join(COLUMNS)} FROM transactions
+                WHERE user_id = ? AND date < ?
+                ORDER BY date, id
+            ''', (user_id, cutoff))]
+            if not rows:
+                conn.rollback()
+                return 0
+
+            by_month: Dict[int, List[Dict]] = {}
+            for r in rows:
+                by_month.setdefault(month_key(r['date']), []).append(r)
+            for month, month_rows in by_month.items():
+                self._write_month(user_id, month, month_rows)
+
+            conn.execute('DELETE FROM transactions WHERE user_id = ? AND date < ?', (user_id, cutoff))
+            conn.commit()
+
+        logger.info(f"Usuário {user_id}: {len(rows)} transações arquivadas em {len(by_month)} meses")
+        return len(rows)
+
+    def archive_all(self, keep_months: int = 3) -> int:
+        """Arquiva meses fechados de todos os usuários"""
+        return sum(self.archive_closed_months(user_id, keep_months) for user_id in self.db.get_user_ids())
+
+    def _cutoff_day(self, keep_months: int) -> int:
+        today = date.today()
+        months = today.year * 12 + today.month - 1 - keep_months
+        return to_day_number(date(months // 12, months % 12 + 1, 1))
+
+    def _month_path(self, user_id: int, month: int) -> Path:
+        return self.archive_dir / str(user_id) / f"{month}.parquet"
+
+    def _write_month(self, user_id: int, month: int, rows: List[Dict]) -> None:
+        path = self._month_path(user_id, month)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        table = _to_table(rows)
+        if path.exists():
+            # Linhas atrasadas de um mês já arquivado: regrava o mês inteiro
+            existing = pq.read_table(path, schema=_schema())
+            new_ids = pa.array([r['id'] for r in rows], pa.int64())
+            existing = existing.filter(pc.invert(pc.is_in(existing['id'], value_set=new_ids)))
+            table = pa.concat_tables([existing, table]).sort_by([('date', 'ascending'), ('id', 'ascending')])
+        tmp_path = path.with_suffix('.parquet.tmp')
+        pq.write_table(table, tmp_path, compression='zstd')
+        os.replace(tmp_path, path)
+
+    # --- Consulta ---
+
+    def _archived_months(self, user_id: int) -> List[int]:
+        user_dir = self.archive_dir / str(user_id)
+        if not user_dir.exists():
+            return []
+        return sorted(int(p.stem) for p in user_dir.glob('*.parquet'))
+
+    def iter_batches(self, user_id: int, start_day: int = None, end_day: int = None,
+                     batch_size: int = BATCH_SIZE,
+                     merchant_ids: List[int] = None) -> Iterator[List[TransactionRecord]]:
+        """Percorre o histórico em lotes: meses arquivados e depois o SQLite"""
+        first = month_key(start_day) if start_day is not None else None
+        last = month_key(end_day) if end_day is not None else None
+
+        months = self._archived_months(user_id)
+        if months:
+            _require_pyarrow()
+        for month in months:
+            # Poda por nome de arquivo antes de abrir o Parquet
+            if (first and month < first) or (last and month > last):
+                continue
+            path = self._month_path(user_id, month)
+            if merchant_ids is not None:
+                batches = pq.read_table(
+                    path, schema=_schema(), filters=[('merchant_id', 'in', list(merchant_ids))]
+                ).to_batches(max_chunksize=batch_size)
+            else:
+                batches = pq.ParquetFile(path).iter_batches(batch_size=batch_size)
+            for batch in batches:
+                rows = self._filter_days(_batch_to_rows(batch), start_day, end_day)
+                if rows:
+                    yield rows
+
+        merchant_filter = ''
+        params = [user_id,
+                  start_day if start_day is not None else -2**31,
+                  end_day if end_day is not None else 2**31]
+        if merchant_ids is not None:
+            merchant_filter = f"AND merchant_id IN ({', '.join('?' * len(merchant_ids))})"
+            params.extend(merchant_ids)
+
+        with self.db._get_connection(user_id) as conn:
+            cursor = conn.execute(f'''
+                SELECT {", ".join(COLUMNS)} FROM transactions
+                WHERE user_id = ? AND date BETWEEN ? AND ? {merchant_filter}
+                ORDER BY date, id
+            ''', params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield [dict(r) for r in rows]
+
+    def load_expense_arrays(self, user_id: int, merchant_ids: List[int] = None) -> Dict[str, "np.ndarray"]:
+        """Saídas com merchant_id das duas camadas, direto em arrays NumPy"""
+        parts = {'id': [], 'date': [], 'amount': [], 'merchant_id': []}
+        filters = [('amount', '<', 0), ('merchant_id', '>', 0)]
+        if merchant_ids is not None:
+            filters.append(('merchant_id', 'in', list(merchant_ids)))
+
+        months = self._archived_months(user_id)
+        if months:
+            _require_pyarrow()
+        for month in months:
+            table = pq.read_table(self._month_path(user_id, month), schema=_schema(),
+                                  columns=list(parts), filters=filters)
+            for name in parts:
+                column = table.column(name)
+                if name == 'date':
+                    column = column.cast(pa.int32())
+                parts[name].append(column.to_numpy().astype(np.int64))
+
+        merchant_filter = ''
+        params = [user_id]
+        if merchant_ids is not None:
+            merchant_filter = f"AND merchant_id IN ({', '.join('?' * len(merchant_ids))})"
+            params.extend(merchant_ids)
+        with self.db._get_connection(user_id) as conn:
+            # Tuplas simples: a conversão para array dispensa sqlite3.Row
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            rows = cursor.execute(f'''
+                SELECT id, date, amount, merchant_id FROM transactions
+                WHERE user_id = ? AND amount < 0 AND merchant_id IS NOT NULL {merchant_filter}
+            ''', params).fetchall()
+        if rows:
+            columns = np.array(rows, dtype=np.int64).T
+            for name, values in zip(parts, columns):
+                parts[name].append(values)
+
+        return {name: np.concatenate(values) if values else np.zeros(0, dtype=np.int64)
+                for name, values in parts.items()}
+
+    @staticmethod
+    def _filter_days(rows, start_day, end_day):
+        if start_day is None and end_day is None:
+            return rows
+        lo = start_day if start_day is not None else -2**31
+        hi = end_day if end_day is not None else 2**31
+        return [r for r in rows if lo <= r['date'] <= hi]
+
+    def get_balance(self, user_id: int) -> float:
+        """Saldo em reais somando o SQLite e os meses arquivados"""
+        cents = self.db.get_balance_cents(user_id)
+        months = self._archived_months(user_id)
+        if months:
+            _require_pyarrow()
+        for month in months:
+            amounts = pq.read_table(self._month_path(user_id, month), columns=['amount'])['amount']
+            cents += pc.sum(amounts).as_py() or 0
+        return from_cents(cents)
+
+    def get_transactions_between(self, user_id: int, start_day: int, end_day: int) -> List[TransactionRecord]:
+        """Equivalente a DatabaseManager.get_transactions_between, incluindo o arquivo"""
+        result = []
+        for rows in self.iter_batches(user_id, start_day, end_day):
+            result.extend(rows)
+        return result
+
+    def get_spending_by_merchant(self, user_id: int, start_day: int = None, end_day: int = None,
+                                 limit: int = 10) -> List[Dict]:
+        """Maiores gastos por merchant canônico no período, em centavos, nas duas camadas"""
+        totals: Dict[int, Dict] = {}
+        for rows in self.iter_batches(user_id, start_day, end_day):
+            for r in rows:
+                if r['amount'] >= 0 or r['merchant_id'] is None:
+                    continue
+                current = totals.setdefault(r['merchant_id'], {'merchant_id': r['merchant_id'], 'total': 0, 'count': 0})
+                current['total'] += r['amount']
+                current['count'] += 1
+        return sorted(totals.values(), key=lambda m: m['total'])[:limit]
+
+    def get_last_transactions(self, user_id: int, limit: int = 5) -> List[Dict]:
+        """Últimas transações das duas camadas, por (date, id) decrescente"""
+        recent = self.db.get_last_rows(user_id, limit)
+        months = self._archived_months(user_id)
+        if months:
+            _require_pyarrow()
+        # Importações atrasadas deixam no SQLite linhas mais antigas que as
+        # arquivadas: as camadas são combinadas antes do corte
+        oldest = month_key(recent[-1]['date']) if len(recent) >= limit else None
+        archived = []
+        for month in reversed(months):
+            if len(archived) >= limit or (oldest is not None and month < oldest):
+                break
+            table = pq.read_table(self._month_path(user_id, month), schema=_schema())
+            archived.extend(_batch_to_rows(table))
+        rows = sorted(recent + archived, key=lambda r: (r['date'], r['id']), reverse=True)
+        return [statement_line(r) for r in rows[:limit]]
+
+    def get_monthly_totals(self, user_id: int) -> List[Dict]:
+        """Entradas e saídas por mês (AAAAMM), em centavos, nas duas camadas"""
+        totals: Dict[int, Dict] = {}
+        for month in self._archived_months(user_id):
+            _require_pyarrow()
+            amounts = pq.read_table(self._month_path(user_id, month), columns=['amount'])['amount']
+            totals[month] = {
+                'month': month,
+                'income': pc.sum(pc.if_else(pc.greater(amounts, 0), amounts, 0)).as_py() or 0,
+                'expenses': pc.sum(pc.if_else(pc.less(amounts, 0), amounts, 0)).as_py() or 0,
+                'count': len(amounts)
+            }
+        for row in self.db.get_monthly_totals(user_id):
+            current = totals.setdefault(row['month'], {'month': row['month'], 'income': 0, 'expenses': 0, 'count': 0})
+            current['income'] += row['income']
+            current['expenses'] += row['expenses']
+            current['count'] += row['count']
+        return [totals[m] for m in sorted(totals)]
+
+    # --- Exportação ---
+
+    def export(self, user_id: int, output_path: str, fmt: str = 'csv') -> int:
+        """Grava o histórico completo em CSV ou Parquet, lote a lote"""
+        if fmt == 'csv':
+            return self._export_csv(user_id, output_path)
+        if fmt == 'parquet':
+            return self._export_parquet(user_id, output_path)
+        raise ValueError(f"Formato de exportação não suportado: {fmt}")
+
+    def _export_csv(self, user_id: int, output_path: str) -> int:
+        count = 0
+        with open(output_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['data', 'descricao', 'valor', 'categoria', 'origem', 'identificador'])
+            for rows in self.iter_batches(user_id):
+                writer.writerows([
+                    format_day(r['date'], '%Y-%m-%d'),
+                    r['description'],
+                    f"{r['amount'] / 100:.2f}",
+                    r['category'] or '',
+                    r['source'] or '',
+                    r['external_id'] or ''
+                ] for r in rows)
+                count += len(rows)
+        return count
+
+    def _export_parquet(self, user_id: int, output_path: str) -> int:
+        _require_pyarrow()
+        count = 0
+        with pq.ParquetWriter(output_path, _schema(), compression='zstd') as writer:
+            for rows in self.iter_batches(user_id):
+                writer.write_table(_to_table(rows))
+                count += len(rows)
+        return count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Arquiva meses fechados em Parquet")
+    parser.add_argument('--keep-months', type=int, default=3,
+                        help="Meses recentes mantidos no SQLite (padrão: 3)")
+    parser.add_argument('--user', type=int, help="Arquiva apenas este usuário")
+    parser.add_argument('--vacuum', action='store_true', help="Compacta o SQLite ao final")
+    args = parser.parse_args()
+
+    db = DatabaseManager()
+    archive = TransactionArchive(db)
+    if args.user is not None:
+        count = archive.archive_closed_months(args.user, args.keep_months)
+    else:
+        count = archive.archive_all(args.keep_months)
+    print(f"{count} transações arquivadas em {archive.archive_dir}")
+
+    if args.vacuum and count:
+        db.vacuum()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
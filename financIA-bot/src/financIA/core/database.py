@@ -1,50 +1,268 @@
 import sqlite3
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 import logging
+from typing import Iterator, List, Dict
 from src.financIA.config import Config
+from src.financIA.core.records import TransactionRecord, from_cents, format_day
+from src.financIA.core import migrations
+from src.financIA.core.sharding import ConnectionCache, HashRing
 
 logger = logging.getLogger(__name__)
 
+SHARD_MODES = ('single', 'hash', 'user')
+
+
+def statement_line(row: TransactionRecord) -> Dict:
+    """Transação formatada para o extrato do bot"""
+    return {
+        'date': format_day(row['date']),
+        'description': row['description'],
+        'amount': from_cents(row['amount']),
+        'category': row['category']
+    }
+
+
 class DatabaseManager:
-    """Gerencia todas as operações do banco de dados"""
-    
-    def __init__(self, db_path: str = None):
+    """
+    Gerencia todas as operações do banco de dados.
+
+    Em `shard_mode` 'hash' ou 'user', as tabelas de cada usuário ficam num
+    arquivo próprio do shard (ver core/sharding.py); o banco principal guarda
+    as tabelas globais e é anexado como `catalog` nas conexões de shard.
+    """
+
+    # Classe das conexões abertas (sqlite3.connect(factory=...))
+    connection_class = sqlite3.Connection
+
+    def __init__(self, db_path: str = None, shard_mode: str = None, shards: int = None,
+                 shard_dir: str = None, max_open_shards: int = None):
         self.db_path = db_path or str(Config.DB_PATH)
+        self.shard_mode = shard_mode or Config.DB_SHARD_MODE
+        if self.shard_mode not in SHARD_MODES:
+            raise ValueError(f"DB_SHARD_MODE inválido: {self.shard_mode} (use {', '.join(SHARD_MODES)})")
+        if shard_dir:
+            self.shard_dir = Path(shard_dir)
+        elif db_path:
+            self.shard_dir = Path(db_path).parent / f"{Path(db_path).stem}_shards"
+        else:
+            self.shard_dir = Config.DB_SHARD_DIR
+        self._ring = None
+        if self.shard_mode == 'hash':
+            self._ring = HashRing(f"shard_{i:03d}" for i in range(shards or Config.DB_SHARDS))
+        self._ready = set()
+        self._ready_lock = threading.Lock()
+        self._cache = ConnectionCache(self._open, max_open_shards or Config.DB_MAX_OPEN_SHARDS)
         self._init_db()
 
     def _init_db(self):
         """Cria a estrutura inicial do banco"""
         with self._get_connection() as conn:
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS transactions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    date TEXT NOT NULL,
-                    description TEXT NOT NULL,
-                    amount REAL NOT NULL,
-                    category TEXT,
-                    user_id INTEGER
-                )""")
+            if migrations.needs_migration(conn):
+                logger.info(f"Migrando banco legado: {self.db_path}")
+                migrations.migrate_connection(conn)
+            migrations.create_schema(conn)
             conn.commit()
+            if self.shard_mode != 'single' and self._user_ids(conn):
+                logger.warning(f"{self.db_path} ainda tem dados de usuários; rode "
+                               "python -m src.financIA.core.sharding rebalance")
+
+    # --- Conexões e roteamento ---
 
-    def _get_connection(self):
-        """Retorna uma conexão com o banco (agora como gerenciador de contexto)"""
-        conn = sqlite3.connect(self.db_path)
+    def shard_path(self, user_id: int = None) -> str:
+        """Arquivo que guarda as linhas do usuário (o banco principal se None)"""
+        if user_id is None or self.shard_mode == 'single':
+            return self.db_path
+        if self.shard_mode == 'user':
+            return str(self.shard_dir / f"user_{user_id}.db")
+        return str(self.shard_dir / f"{self._ring.node_for(str(user_id))}.db")
+
+    def shard_paths(self) -> List[str]:
+        """Banco principal e todos os arquivos de shard existentes"""
+        paths = [self.db_path]
+        if self.shard_dir.exists():
+            paths.extend(str(p) for p in sorted(self.shard_dir.glob('*.db')))
+        return paths
+
+    def _open(self, path: str) -> sqlite3.Connection:
+        if path != self.db_path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30, check_same_thread=False, factory=self.connection_class)
         conn.row_factory = sqlite3.Row
+        # WAL: leituras não bloqueiam a escrita do mesmo arquivo
+        conn.execute("PRAGMA journal_mode=WAL")
+        if path != self.db_path:
+            with self._ready_lock:
+                if path not in self._ready:
+                    migrations.create_schema(conn, include_catalog=False)
+                    conn.commit()
+                    self._ready.add(path)
+            conn.execute("ATTACH DATABASE ? AS catalog", (self.db_path,))
         return conn
+
+    @contextmanager
+    def _connect(self, path: str) -> Iterator[sqlite3.Connection]:
+        """Empresta uma conexão do cache; confirma ou desfaz a transação ao sair"""
+        conn = self._cache.acquire(path)
+        try:
+            yield conn
+            if conn.in_transaction:
+                conn.commit()
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            self._cache.release(path, conn)
+
+    def _get_connection(self, user_id: int = None):
+        """Conexão com o shard do usuário (ou com o banco principal) como gerenciador de contexto"""
+        return self._connect(self.shard_path(user_id))
+
+    def close(self) -> None:
+        """Fecha as conexões ociosas de todos os arquivos"""
+        self._cache.close_all()
+
+    # --- Consultas administrativas (todos os shards) ---
+
+    @staticmethod
+    def _user_ids(conn: sqlite3.Connection) -> List[int]:
+        union = ' UNION '.join(
+            f"SELECT user_id FROM main.{table} WHERE user_id IS NOT NULL" for table in migrations.USER_TABLES
+        )
+        return [r[0] for r in conn.execute(f"SELECT user_id FROM ({union}) ORDER BY user_id")]
+
+    def get_user_ids(self) -> List[int]:
+        """Usuários com dados em qualquer arquivo"""
+        users = set()
+        for path in self.shard_paths():
+            with self._connect(path) as conn:
+                users.update(self._user_ids(conn))
+        return sorted(users)
+
+    def get_shard_stats(self) -> List[Dict]:
+        """Usuários, transações e tamanho de cada arquivo"""
+        stats = []
+        for path in self.shard_paths():
+            with self._connect(path) as conn:
+                transactions = conn.execute('SELECT COUNT(*) FROM main.transactions').fetchone()[0]
+                users = len(self._user_ids(conn))
+            stats.append({'path': path, 'users': users, 'transactions': transactions,
+                          'size': Path(path).stat().st_size})
+        return stats
+
+    def vacuum(self) -> None:
+        """Compacta todos os arquivos"""
+        for path in self.shard_paths():
+            with self._connect(path) as conn:
+                conn.execute("VACUUM")
+
+    # --- Transações ---
+
+    def save_transactions(self, transactions: List[TransactionRecord], user_id: int = None,
+                          fingerprints: List[str] = None) -> int:
+        """
+        Grava transações normalizadas (centavos e número de dias).
+        `fingerprints` (linhas de extrato de `user_id`) entram na mesma
+        transação: ou linhas e impressões digitais são gravadas, ou nada.
+        """
+        by_user: Dict[int, List[tuple]] = {}
+        for t in transactions:
+            owner = t.get('user_id') or user_id
+            by_user.setdefault(owner, []).append((
+                owner,
+                t['date'],
+                t['description'],
+                t['amount'],
+                t.get('category'),
+                t.get('source'),
+                t.get('external_id'),
+                t.get('merchant_id')
+            ))
+        if fingerprints:
+            by_user.setdefault(user_id, [])
+        for owner, rows in by_user.items():
+            with self._get_connection(owner) as conn:
+                conn.executemany('''
+                    INSERT INTO transactions
+                    (user_id, date, description, amount, category, source, external_id, merchant_id)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', rows)
+                if fingerprints and owner == user_id:
+                    conn.executemany('''
+                        INSERT OR IGNORE INTO imported_rows (user_id, fingerprint) VALUES (?, ?)
+                    ''', ((user_id, f) for f in fingerprints))
+                conn.commit()
+        return len(transactions)
+
+    def get_balance_cents(self, user_id: int) -> int:
+        """Soma exata, em centavos, das transações no SQLite"""
+        with self._get_connection(user_id) as conn:
+            return conn.execute(
+                'SELECT COALESCE(SUM(amount), 0) FROM transactions WHERE user_id = ?',
+                (user_id,)
+            ).fetchone()[0]
+
+    def get_balance(self, user_id: int) -> float:
+        """Saldo do usuário em reais, só das linhas no SQLite (ver TransactionArchive.get_balance)"""
+        return from_cents(self.get_balance_cents(user_id))
+
+    def get_last_rows(self, user_id: int, limit: int = 5) -> List[TransactionRecord]:
+        """Últimas transações do SQLite, por (date, id) decrescente"""
+        with self._get_connection(user_id) as conn:
+            rows = conn.execute('''
+                SELECT id, date, description, amount, category
+                FROM transactions
+                WHERE user_id = ?
+                ORDER BY date DESC, id DESC
+                LIMIT ?
+            ''', (user_id, limit)).fetchall()
+        return [dict(r) for r in rows]
+
+    def get_last_transactions(self, user_id: int, limit: int = 5) -> List[Dict]:
+        """Últimas transações já formatadas para exibição"""
+        return [statement_line(r) for r in self.get_last_rows(user_id, limit)]
+
+    def get_transactions_between(self, user_id: int, start_day: int, end_day: int) -> List[TransactionRecord]:
+        """Transações do usuário entre dois números de dias (inclusive)"""
+        with self._get_connection(user_id) as conn:
+            rows = conn.execute('''
+                SELECT id, user_id, date, description, amount, category, source, external_id, merchant_id
+                FROM transactions
+                WHERE user_id = ? AND date BETWEEN ? AND ?
+                ORDER BY date, id
+            ''', (user_id, start_day, end_day)).fetchall()
+        return [dict(r) for r in rows]
+
+    def get_monthly_totals(self, user_id: int) -> List[Dict]:
+        """Entradas e saídas por mês (AAAAMM), em centavos"""
+        with self._get_connection(user_id) as conn:
+            rows = conn.execute('''
+                SELECT CAST(strftime('%Y%m', date * 86400, 'unixepoch') AS INTEGER) AS month,
+                       SUM(CASE WHEN amount > 0 THEN amount ELSE 0 END) AS income,
+                       SUM(CASE WHEN amount < 0 THEN amount ELSE 0 END) AS expenses,
+                       COUNT(*) AS count
+                FROM transactions
+                WHERE user_id = ?
+                GROUP BY month
+                ORDER BY month
+            ''', (user_id,)).fetchall()
+        return [dict(r) for r in rows]
+
     def save_open_finance_connection(self, user_id: int, account_id: str, token: str):
-        with self._get_connection() as conn:
+        with self._get_connection(user_id) as conn:
             conn.execute('''
-                INSERT OR REPLACE INTO open_finance_connections 
-                (user_id, account_id, access_token) 
+                INSERT OR REPLACE INTO open_finance_connections
+                (user_id, account_id, access_token)
                 VALUES (?, ?, ?)
             ''', (user_id, account_id, token))
             conn.commit()
 
     def get_of_connection(self, user_id: int) -> dict:
-        with self._get_connection() as conn:
-            cursor = conn.execute('''
-                SELECT account_id, access_token 
-                FROM open_finance_connections 
+        with self._get_connection(user_id) as conn:
+            return conn.execute('''
+                SELECT account_id, access_token
+                FROM open_finance_connections
                 WHERE user_id = ?
-         ''', (user_id,))
-        return cursor.fetchone()
\ No newline at end of file
+            ''', (user_id,)).fetchone()
@@ -0,0 +1,347 @@
+"""
+Canonicalização de estabelecimentos/contrapartes.
+
+"PIX ENVIADO JOAO S 12/03", "COMPRA CARTAO IFOOD *123" e "IFOOD SAO PAULO"
+viram descrições normalizadas que o índice associa a um merchant_id
+canônico, por igualdade ou por n-gramas de caracteres com hash.
+
+Uso (preenche merchant_id em transações antigas):
+    python -m src.financIA.core.merchants
+"""
+import logging
+import re
+import threading
+import unicodedata
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple, TypeVar
+
+from src.financIA.core.database import DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+K = TypeVar('K')
+
+# Prefixos de operação que não identificam a contraparte
+OPERATION_PREFIXES = re.compile(r'''^(?:
+    PIX\s+(?:ENVIADO|RECEBIDO|TRANSF(?:ERENCIA)?)? |
+    TRANSFERENCIA\s+(?:ENVIADA|RECEBIDA)(?:\s+PELO\s+PIX)? |
+    TED\s+(?:ENVIADA|RECEBIDA)? | DOC\s+(?:ENVIADO|RECEBIDO)? |
+    COMPRA\s+(?:NO\s+)?(?:CARTAO|DEBITO|CREDITO)(?:\s+(?:DEBITO|CREDITO))? |
+    PAGAMENTO\s+(?:DE\s+)?(?:BOLETO|FATURA)? | PAG\s+BOLETO |
+    DEBITO\s+AUTOMATICO | COMPRA
+)\s*[-:]?\s*''', re.VERBOSE)
+
+NOISE_PATTERNS = [
+    re.compile(r'\b\d{1,2}/\d{1,2}(?:/\d{2,4})?\b'),               # datas 12/03, parcelas 1/3
+    re.compile(r'\b\d{2}:\d{2}(?::\d{2})?\b'),                      # horários
+    re.compile(r'\b[0-9A-F]{8}-[0-9A-F]{4}-[0-9A-F]{4}-[0-9A-F]{4}-[0-9A-F]{12}\b'),  # UUIDs
+    re.compile(r'\b\d{2}\.?\d{3}\.?\d{3}/?\d{4}-?\d{2}\b'),         # CNPJ
+    re.compile(r'\b\d{3}\.?\d{3}\.?\d{3}-?\d{2}\b'),                # CPF
+    re.compile(r'\*+\s*\d*'),                                       # sufixo de cartão *123
+    re.compile(r'\bFINAL\s+\d{4}\b'),
+    re.compile(r'\b(?:AGENCIA|AG|CONTA|CC|BCO|BANCO)\b\s*[:.]?\s*\d[\d./-]*'),  # AG 1234, CC 56789-0
+]
+
+# Tokens com dígitos; só os códigos (ver is_code) são removidos
+DIGIT_TOKEN = re.compile(r'\b\w*\d\w*\b')
+
+# Transferências nomeiam pessoas: "MARIA SANTOS" não perde o sobrenome
+TRANSFER_PREFIX = re.compile(r'^(?:PIX|TED|DOC|TRANSF)')
+
+# Sufixos de cidade/UF/país dos descritores de cartão ("IFOOD SAO PAULO SP BR").
+# Cidades que também são nomes de pessoa (SALVADOR, NATAL, VITORIA, SANTOS)
+# ficam de fora
+LOCATION_SUFFIXES = [tuple(city.split()) for city in (
+    'SAO PAULO', 'RIO DE JANEIRO', 'BELO HORIZONTE', 'BRASILIA', 'CURITIBA', 'PORTO ALEGRE',
+    'RECIFE', 'FORTALEZA', 'MANAUS', 'BELEM', 'GOIANIA', 'CAMPINAS', 'GUARULHOS', 'OSASCO',
+    'BARUERI', 'FLORIANOPOLIS', 'NITEROI', 'SANTO ANDRE', 'SAO BERNARDO DO CAMPO',
+    'SAO JOSE DOS CAMPOS', 'RIBEIRAO PRETO', 'SOROCABA', 'JUNDIAI', 'UBERLANDIA',
+    'CONTAGEM', 'MACEIO', 'SAO LUIS', 'TERESINA', 'CUIABA', 'CAMPO GRANDE', 'ARACAJU',
+    'PORTO VELHO', 'RIO BRANCO', 'MACAPA', 'BOA VISTA', 'PALMAS', 'LONDRINA', 'JOINVILLE',
+)]
+LOCATION_CODES = {
+    'AC', 'AL', 'AP', 'AM', 'BA', 'CE', 'DF', 'ES', 'GO', 'MA', 'MT', 'MS', 'MG', 'PA',
+    'PB', 'PR', 'PE', 'PI', 'RJ', 'RN', 'RS', 'RO', 'RR', 'SC', 'SP', 'SE', 'TO',
+    'BR', 'BRA', 'BRASIL',
+}
+
+NGRAM = 3
+NUM_BUCKETS = 1 << 20
+
+# Similaridade mínima para aceitar um merchant existente
+MATCH_THRESHOLD = 0.8
+
+# N-gramas presentes em mais merchants que isto não geram candidatos
+# (exceto os MIN_CANDIDATE_GRAMS mais raros da descrição)
+MAX_POSTINGS = 200
+MIN_CANDIDATE_GRAMS = 2
+MAX_CANDIDATES = 50
+
+
+def normalize_description(description: str) -> str:
+    """Remove datas, ids, sufixos de cartão e prefixos de operação"""
+    text = unicodedata.normalize('NFKD', description or '')
+    text = ''.join(c for c in text if not unicodedata.combining(c)).upper()
+    text = text.strip()
+    transfer = TRANSFER_PREFIX.match(text) is not None
+    text = OPERATION_PREFIXES.sub('', text)
+    for pattern in NOISE_PATTERNS:
+        text = pattern.sub(' ', text)
+    text = DIGIT_TOKEN.sub(lambda m: ' ' if is_code(m.group()) else m.group(), text)
+    text = re.sub(r'[^A-Z0-9 ]+', ' ', text)
+    tokens = text.split()
+    if not transfer:
+        tokens = strip_location(tokens)
+    return ' '.join(tokens)
+
+
+def is_code(token: str) -> bool:
+    """Ids, NSU e números de loja ("000123", "042X", "A1B2C3D4E5"); marcas como "99POP" ficam"""
+    digits = sum(c.isdigit() for c in token)
+    return (digits >= 3 and 2 * digits > len(token)) or len(token) > 7
+
+
+def strip_location(tokens: List[str]) -> List[str]:
+    """Remove cidade, UF e país do fim do descritor, mantendo ao menos um token"""
+    while len(tokens) > 1:
+        if tokens[-1] in LOCATION_CODES:
+            tokens = tokens[:-1]
+            continue
+        city = next((c for c in LOCATION_SUFFIXES
+                     if len(c) < len(tokens) and tuple(tokens[-len(c):]) == c), None)
+        if city is None:
+            break
+        tokens = tokens[:-len(city)]
+    return tokens
+
+
+def hashed_ngrams(text: str) -> Set[int]:
+    """N-gramas de caracteres mapeados em NUM_BUCKETS por CRC32"""
+    padded = f" {text} "
+    return {
+        zlib.crc32(padded[i:i + NGRAM].encode()) & (NUM_BUCKETS - 1)
+        for i in range(max(len(padded) - NGRAM + 1, 1))
+    }
+
+
+class MerchantIndex:
+    """Índice em memória de merchants, persistido nas tabelas merchants/merchant_aliases"""
+
+    def __init__(self, db: DatabaseManager):
+        self.db = db
+        self._aliases: Dict[str, int] = {}
+        self._names: Dict[int, str] = {}
+        # Categoria por (merchant, é entrada): "PIX ENVIADO JOAO S" e
+        # "PIX RECEBIDO JOAO S" são o mesmo merchant com sentidos opostos
+        self._categories: Dict[Tuple[int, bool], str] = {}
+        # Ids na ordem de criação (ver resolve_many)
+        self._created: List[int] = []
+        # Categorias ainda não gravadas (ver set_categories)
+        self._pending_categories: Dict[Tuple[int, bool], str] = {}
+        self._grams: Dict[int, Set[int]] = {}
+        self._postings: Dict[int, Set[int]] = {}
+        # Importações de usuários diferentes rodam em paralelo (threads)
+        self._lock = threading.RLock()
+        self._load()
+
+    def _load(self):
+        with self.db._get_connection() as conn:
+            for row in conn.execute('SELECT id, name, category, income_category FROM merchants'):
+                self._add_merchant(row['id'], row['name'])
+                for income, category in ((False, row['category']), (True, row['income_category'])):
+                    if category is not None:
+                        self._categories[(row['id'], income)] = category
+            for row in conn.execute('SELECT alias, merchant_id FROM merchant_aliases'):
+                self._aliases[row['alias']] = row['merchant_id']
+
+    def _add_merchant(self, merchant_id: int, name: str, grams: Set[int] = None):
+        grams = grams or hashed_ngrams(name)
+        self._names[merchant_id] = name
+        self._created.append(merchant_id)
+        self._grams[merchant_id] = grams
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(merchant_id)
+
+    def match(self, normalized: str) -> Optional[int]:
+        """Merchant mais parecido acima do limiar, sem criar novos"""
+        if normalized in self._aliases:
+            return self._aliases[normalized]
+
+        grams = hashed_ngrams(normalized)
+        # Candidatos vêm dos n-gramas mais raros; os comuns ("LOJA", "PAG")
+        # listariam quase todo o índice
+        by_rarity = sorted(grams, key=lambda g: len(self._postings.get(g, ())))
+        candidates = Counter()
+        for i, gram in enumerate(by_rarity):
+            postings = self._postings.get(gram, ())
+            if i >= MIN_CANDIDATE_GRAMS and len(postings) > MAX_POSTINGS:
+                break
+            candidates.update(postings)
+
+        return self._best(grams, ((merchant_id, self._grams[merchant_id])
+                                  for merchant_id, _ in candidates.most_common(MAX_CANDIDATES)))
+
+    @staticmethod
+    def _best(grams: Set[int], candidates: Iterable[Tuple[K, Set[int]]]) -> Optional[K]:
+        """Candidato mais parecido acima do limiar; no empate, o de nome mais curto"""
+        best, best_score, best_size = None, 0.0, 0
+        for key, other in candidates:
+            # Dice simétrico: "MARIA" não absorve "MARIA SANTOS" só por estar contido nele
+            score = 2 * len(grams & other) / (len(grams) + len(other))
+            if score > best_score or (score == best_score and best is not None and len(other) < best_size):
+                best, best_score, best_size = key, score, len(other)
+        return best if best_score >= MATCH_THRESHOLD else None
+
+    def resolve(self, description: str) -> Optional[int]:
+        """merchant_id canônico da descrição; cria o merchant se for novo"""
+        return self.resolve_many([description])[0]
+
+    def resolve_many(self, descriptions: List[str]) -> List[Optional[int]]:
+        """
+        Resolve um lote de descrições.
+        Aliases conhecidos saem do dicionário em memória, sem lock nem escrita;
+        só descrições nunca vistas passam por _register.
+        """
+        normalized = [normalize_description(d) for d in descriptions]
+        unseen = [n for n in dict.fromkeys(normalized) if n and n not in self._aliases]
+        if unseen:
+            self._register(unseen)
+        return [self._aliases[n] if n else None for n in normalized]
+
+    def _register(self, texts: List[str]) -> None:
+        """
+        Associa descrições novas a merchants, criando os que faltam.
+        A busca por n-gramas e o agrupamento das novas entre si rodam fora do
+        lock; sob o lock ficam só a conferência dos merchants criados nesse
+        meio-tempo e um commit no banco principal.
+        """
+        known = len(self._created)
+        aliases: Dict[str, int] = {}
+        heads: Dict[str, Set[int]] = {}          # merchants novos do lote -> n-gramas
+        head_of: Dict[str, str] = {}
+        head_postings: Dict[int, List[str]] = {}
+        for text in texts:
+            merchant_id = self._match_unlocked(text)
+            if merchant_id is not None:
+                aliases[text] = merchant_id
+                continue
+            grams = hashed_ngrams(text)
+            shared = Counter()
+            for gram in grams:
+                shared.update(head_postings.get(gram, ()))
+            head = self._best(grams, ((h, heads[h]) for h, _ in shared.most_common(MAX_CANDIDATES)))
+            if head is None:
+                head = text
+                heads[text] = grams
+                for gram in grams:
+                    head_postings.setdefault(gram, []).append(text)
+            head_of[text] = head
+
+        with self._lock, self.db._get_connection() as conn:
+            # Merchants criados por outras importações depois da busca acima
+            recent = [(merchant_id, self._grams[merchant_id]) for merchant_id in self._created[known:]]
+            head_ids: Dict[str, int] = {}
+            for head, grams in heads.items():
+                merchant_id = self._aliases.get(head) or self._best(grams, recent)
+                if merchant_id is not None:
+                    head_ids[head] = merchant_id
+            created = [head for head in heads if head not in head_ids]
+            if created:
+                conn.executemany('INSERT INTO merchants (name) VALUES (?)', ((head,) for head in created))
+                # Um só escritor na transação: AUTOINCREMENT gera ids consecutivos
+                last_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
+                head_ids.update(zip(created, range(last_id - len(created) + 1, last_id + 1)))
+            aliases.update((text, head_ids[head]) for text, head in head_of.items())
+            aliases = {text: merchant_id for text, merchant_id in aliases.items() if text not in self._aliases}
+            conn.executemany('INSERT OR IGNORE INTO merchant_aliases (alias, merchant_id) VALUES (?, ?)',
+                             aliases.items())
+            self._write_categories(conn)
+            conn.commit()
+            # Publicados só após o commit: leitores sem lock nunca veem ids não gravados
+            for head in created:
+                self._add_merchant(head_ids[head], head, heads[head])
+            self._aliases.update(aliases)
+
+    def _match_unlocked(self, normalized: str) -> Optional[int]:
+        try:
+            return self.match(normalized)
+        except RuntimeError:
+            # Postings alterados por outra thread durante a leitura; conferido sob o lock
+            return None
+
+    def name(self, merchant_id: int) -> Optional[str]:
+        return self._names.get(merchant_id)
+
+    def category(self, merchant_id: int, income: bool = False) -> Optional[str]:
+        """Categoria memorizada das saídas (ou entradas) do merchant; None se ainda não categorizado"""
+        return self._categories.get((merchant_id, income))
+
+    def set_categories(self, categories: Dict[Tuple[int, bool], str]) -> None:
+        """
+        Memoriza categorias por (merchant_id, é entrada).
+        Valem na hora para todas as importações; a gravação vai junto com o
+        próximo commit do catálogo (ou flush()), fora do caminho de cada
+        importação. Perdê-las numa queda só faz o modelo rodar de novo.
+        """
+        with self._lock:
+            self._categories.update(categories)
+            self._pending_categories.update(categories)
+
+    def flush(self) -> None:
+        """Grava as categorias pendentes no banco principal"""
+        with self._lock:
+            if not self._pending_categories:
+                return
+            with self.db._get_connection() as conn:
+                self._write_categories(conn)
+                conn.commit()
+
+    def _write_categories(self, conn) -> None:
+        if not self._pending_categories:
+            return
+        for income, column in ((False, 'category'), (True, 'income_category')):
+            conn.executemany(f'UPDATE merchants SET {column} = ? WHERE id = ?', (
+                (category, merchant_id)
+                for (merchant_id, is_income), category in self._pending_categories.items()
+                if is_income == income
+            ))
+        self._pending_categories.clear()
+
+    def backfill(self, batch_size: int = 5000) -> int:
+        """Preenche merchant_id das transações gravadas antes do índice, em todos os shards"""
+        total = 0
+        for path in self.db.shard_paths():
+            last_id = 0
+            while True:
+                with self.db._connect(path) as conn:
+                    rows = conn.execute('''
+                        SELECT id, description FROM main.transactions
+                        WHERE merchant_id IS NULL AND id > ?
+                        ORDER BY id LIMIT ?
+                    ''', (last_id, batch_size)).fetchall()
+                if not rows:
+                    break
+                merchant_ids = self.resolve_many([r['description'] for r in rows])
+                with self.db._connect(path) as conn:
+                    conn.executemany('UPDATE main.transactions SET merchant_id = ? WHERE id = ?',
+                                     zip(merchant_ids, (r['id'] for r in rows)))
+                    conn.commit()
+                last_id = rows[-1]['id']
+                total += len(rows)
+        return total
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+
+def main() -> None:
+    index = MerchantIndex(DatabaseManager())
+    count = index.backfill()
+    index.flush()
+    print(f"{count} transações associadas a {len(index)} merchants")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,205 @@
+"""
+Migração do banco de transações para o esquema tipado.
+
+Uso:
+    python -m src.financIA.core.migrations data/processed/transactions.db
+"""
+import argparse
+import logging
+import shutil
+import sqlite3
+from pathlib import Path
+from typing import Dict
+
+from src.financIA.core.records import to_cents, to_day_number
+
+logger = logging.getLogger(__name__)
+
+# Versão gravada em PRAGMA user_version
+SCHEMA_VERSION = 4
+
+# Tabelas com linhas de um único usuário (movidas junto com ele entre shards)
+USER_TABLES = ('transactions', 'uploads', 'imported_rows', 'recurring_patterns', 'open_finance_connections')
+
+
+def create_schema(conn: sqlite3.Connection, include_catalog: bool = True) -> None:
+    """
+    Cria tabelas e índices do esquema atual.
+    Shards usam include_catalog=False: merchants vêm do banco principal anexado.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            date INTEGER NOT NULL,       -- dias desde 1970-01-01
+            description TEXT NOT NULL,
+            amount INTEGER NOT NULL,     -- centavos
+            category TEXT,
+            source TEXT,
+            external_id TEXT,
+            merchant_id INTEGER
+        )""")
+    _add_missing_columns(conn, 'transactions', {'merchant_id': 'INTEGER'})
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_transactions_user_date
+        ON transactions (user_id, date)""")
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_transactions_user_merchant
+        ON transactions (user_id, merchant_id, date)""")
+    if include_catalog:
+        # Contrapartes canônicas e as descrições normalizadas que apontam para elas
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS merchants (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                category TEXT,               -- categoria das saídas
+                income_category TEXT         -- categoria das entradas
+            )""")
+        _add_missing_columns(conn, 'merchants', {'income_category': 'TEXT'})
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS merchant_aliases (
+                alias TEXT PRIMARY KEY,
+                merchant_id INTEGER NOT NULL REFERENCES merchants (id)
+            ) WITHOUT ROWID""")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS open_finance_connections (
+            user_id INTEGER PRIMARY KEY,
+            account_id TEXT NOT NULL,
+            access_token TEXT
+        )""")
+    # Extratos recebidos, endereçados pelo hash do conteúdo
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS uploads (
+            user_id INTEGER NOT NULL,
+            sha256 TEXT NOT NULL,
+            file_unique_id TEXT,
+            path TEXT,                   -- NULL após a retenção apagar o arquivo
+            size INTEGER,
+            bank TEXT,
+            total_rows INTEGER,
+            imported_rows INTEGER,
+            created_at INTEGER,
+            PRIMARY KEY (user_id, sha256)
+        )""")
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_uploads_file_unique_id
+        ON uploads (user_id, file_unique_id)""")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS imported_rows (
+            user_id INTEGER NOT NULL,
+            fingerprint TEXT NOT NULL,
+            PRIMARY KEY (user_id, fingerprint)
+        ) WITHOUT ROWID""")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS recurring_patterns (
+            user_id INTEGER NOT NULL,
+            merchant_id INTEGER NOT NULL,
+            period_days INTEGER NOT NULL,
+            occurrences INTEGER NOT NULL,
+            amount INTEGER NOT NULL,     -- valor típico em centavos
+            last_day INTEGER NOT NULL,
+            next_day INTEGER NOT NULL,
+            notified INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, merchant_id)
+        )""")
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+
+def _add_missing_columns(conn: sqlite3.Connection, table: str, columns: Dict[str, str]) -> None:
+    """Acrescenta colunas novas a tabelas criadas por versões anteriores"""
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    for name, ddl in columns.items():
+        if name not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}")
+
+
+def needs_migration(conn: sqlite3.Connection) -> bool:
+    """Indica se o banco ainda usa o esquema antigo (REAL/TEXT)"""
+    columns = {row[1]: row[2].upper() for row in conn.execute("PRAGMA table_info(transactions)")}
+    if not columns:
+        return False
+    return columns.get('amount') == 'REAL' or columns.get('date') == 'TEXT'
+
+
+def migrate_connection(conn: sqlite3.Connection) -> Dict[str, int]:
+    """Converte a tabela legada dentro de uma única transação"""
+    stats = {'migrated': 0, 'skipped': 0}
+    # DDL não abre transação implícita no sqlite3; abrimos explicitamente
+    if not conn.in_transaction:
+        conn.execute("BEGIN")
+    try:
+        _copy_legacy_rows(conn, stats)
+    except Exception:
+        conn.rollback()
+        raise
+    conn.commit()
+    return stats
+
+
+def _copy_legacy_rows(conn: sqlite3.Connection, stats: Dict[str, int]) -> None:
+    conn.execute("ALTER TABLE transactions RENAME TO transactions_legacy")
+    create_schema(conn)
+
+    rows = conn.execute(
+        "SELECT id, date, description, amount, category, user_id FROM transactions_legacy"
+    ).fetchall()
+    converted = []
+    for row_id, date_text, description, amount, category, user_id in rows:
+        try:
+            converted.append((
+                row_id, user_id, to_day_number(date_text), description,
+                to_cents(amount), category, 'legacy'
+            ))
+        except ValueError as e:
+            logger.warning(f"Linha {row_id} ignorada na migração: {str(e)}")
+            stats['skipped'] += 1
+
+    conn.executemany('''
+        INSERT INTO transactions (id, user_id, date, description, amount, category, source)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', converted)
+    stats['migrated'] = len(converted)
+
+    # Linhas não convertidas ficam preservadas para correção manual
+    if not stats['skipped']:
+        conn.execute("DROP TABLE transactions_legacy")
+
+
+def migrate_file(db_path: str, backup: bool = True) -> Dict[str, int]:
+    """Migra um arquivo transactions.db existente, com backup opcional"""
+    path = Path(db_path)
+    if not path.exists():
+        raise ValueError(f"Banco não encontrado: {path}")
+
+    conn = sqlite3.connect(str(path))
+    try:
+        if not needs_migration(conn):
+            logger.info(f"{path} já está no esquema {SCHEMA_VERSION}")
+            return {'migrated': 0, 'skipped': 0}
+
+        if backup:
+            backup_path = path.with_suffix(path.suffix + '.bak')
+            shutil.copy2(path, backup_path)
+            logger.info(f"Backup criado em {backup_path}")
+
+        stats = migrate_connection(conn)
+        conn.execute("VACUUM")
+        return stats
+    finally:
+        conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Migra transactions.db para centavos e datas inteiras")
+    parser.add_argument('db_paths', nargs='+', help="Arquivos transactions.db a migrar")
+    parser.add_argument('--no-backup', action='store_true', help="Não cria cópia .bak antes de migrar")
+    args = parser.parse_args()
+
+    for db_path in args.db_paths:
+        stats = migrate_file(db_path, backup=not args.no_backup)
+        print(f"{db_path}: {stats['migrated']} migradas, {stats['skipped']} ignoradas")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,113 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from typing import TypedDict, Optional, Union, Any
+
+# Dia 0 da numeração de datas armazenada no banco
+EPOCH = date(1970, 1, 1)
+
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d/%m/%y', '%Y/%m/%d', '%d-%m-%Y', '%Y%m%d')
+
+
+class TransactionRecord(TypedDict, total=False):
+    """Formato único de transação usado por parsers, integrações e banco"""
+    date: int            # dias desde 1970-01-01
+    description: str
+    amount: int          # valor em centavos
+    category: Optional[str]
+    user_id: Optional[int]
+    source: str
+    external_id: Optional[str]
+    merchant_id: Optional[int]
+
+
+def to_cents(value: Union[str, int, float, Decimal]) -> int:
+    """Converte um valor monetário (R$) para centavos inteiros"""
+    if isinstance(value, bool):
+        raise ValueError(f"Valor inválido: {value!r}")
+    if isinstance(value, int):
+        return value * 100
+    if isinstance(value, str):
+        value = _decimal_text(value.strip().replace('R$', '').replace(' ', ''))
+    try:
+        # str(float) evita herdar o erro de representação binária
+        amount = Decimal(str(value)) if isinstance(value, float) else Decimal(value)
+    except (InvalidOperation, ValueError, TypeError):
+        raise ValueError(f"Valor inválido: {value!r}")
+    if not amount.is_finite():
+        raise ValueError(f"Valor inválido: {value!r}")
+    return int((amount * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def _decimal_text(text: str) -> str:
+    """
+    Normaliza separadores para Decimal. O último separador é o decimal
+    (1.234,56 ou 1,234.56); repetido (1.234.567), só separa milhares.
+    """
+    position = max(text.rfind(','), text.rfind('.'))
+    if position < 0:
+        return text
+    separator = text[position]
+    if text.count(separator) > 1:
+        integer, fraction, thousands = text, None, separator
+    else:
+        integer, fraction = text[:position], text[position + 1:]
+        thousands = '.' if separator == ',' else ','
+    groups = integer.lstrip('+-').split(thousands)
+    if len(groups) > 1 and (not 1 <= len(groups[0]) <= 3 or any(len(g) != 3 for g in groups[1:])):
+        raise ValueError(f"Valor inválido: {text!r}")
+    integer = integer.replace(thousands, '')
+    return integer if fraction is None else f"{integer}.{fraction}"
+
+
+def from_cents(cents: int) -> float:
+    """Converte centavos para reais (apenas para exibição)"""
+    return cents / 100
+
+
+def to_day_number(value: Union[str, date, datetime]) -> int:
+    """Converte uma data em qualquer formato suportado para número de dias"""
+    if isinstance(value, datetime):
+        value = value.date()
+    if isinstance(value, date):
+        return (value - EPOCH).days
+    text = str(value).strip()
+    # Descarta horário em formatos ISO (2025-03-02T10:00:00)
+    text = text.split('T')[0].split(' ')[0]
+    for fmt in DATE_FORMATS:
+        try:
+            return (datetime.strptime(text, fmt).date() - EPOCH).days
+        except ValueError:
+            continue
+    raise ValueError(f"Data inválida: {value!r}")
+
+
+def from_day_number(day: int) -> date:
+    """Converte número de dias de volta para data"""
+    return EPOCH + timedelta(days=day)
+
+
+def format_day(day: int, fmt: str = '%d/%m/%Y') -> str:
+    """Formata um número de dias para exibição"""
+    return from_day_number(day).strftime(fmt)
+
+
+def month_key(day: int) -> int:
+    """Retorna a chave de mês (AAAAMM) de um número de dias"""
+    d = from_day_number(day)
+    return d.year * 100 + d.month
+
+
+def normalize_transaction(date_value: Any, description: Any, amount: Any, *,
+                          source: str, category: Optional[str] = None,
+                          user_id: Optional[int] = None,
+                          external_id: Optional[str] = None) -> TransactionRecord:
+    """Monta um TransactionRecord a partir de valores brutos"""
+    return TransactionRecord(
+        date=to_day_number(date_value),
+        description=str(description or '').strip(),
+        amount=to_cents(amount),
+        category=category,
+        user_id=user_id,
+        source=source,
+        external_id=str(external_id) if external_id else None
+    )
@@ -0,0 +1,253 @@
+"""
+Detecção vetorizada de cobranças recorrentes e valores fora do padrão.
+
+O histórico de saídas do usuário vira arrays NumPy (dia, valor, merchant_id)
+agrupados pelo merchant canônico (descrição normalizada). Após cada
+importação ou sincronização, apenas os merchants tocados são recalculados.
+
+Uso (varre históricos existentes, depois do backfill de merchants):
+    python -m src.financIA.core.merchants
+    python -m src.financIA.core.recurring
+"""
+import argparse
+import logging
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.financIA.core.archive import TransactionArchive
+from src.financIA.core.database import DatabaseManager
+from src.financIA.core.records import TransactionRecord
+
+logger = logging.getLogger(__name__)
+
+# nome: (período em dias, tolerância em dias, ocorrências mínimas)
+PERIODS = {
+    'semanal': (7, 1, 4),
+    'mensal': (30, 3, 3),
+    'anual': (365, 7, 2),
+}
+
+# Fração mínima de intervalos compatíveis com o período
+MIN_REGULARITY = 0.7
+
+# Desvio robusto (|x - mediana| / MAD escalado) acima do qual o valor é anômalo
+OUTLIER_Z = 3.5
+
+# Com MAD zero (assinatura de valor fixo), qualquer desvio acima disto é anômalo
+MIN_FIXED_DEVIATION = 100  # centavos
+
+# Histórico mínimo de um merchant para julgar um valor como anômalo
+MIN_HISTORY = 4
+
+# Janela de anomalias reportadas na varredura completa
+RECENT_DAYS = 30
+
+
+def _group_median(values: np.ndarray, groups: np.ndarray, n_groups: int) -> np.ndarray:
+    """Mediana de `values` por grupo (NaN para grupos vazios)"""
+    order = np.lexsort((values, groups))
+    sorted_values = values[order]
+    counts = np.bincount(groups, minlength=n_groups)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    medians = np.full(n_groups, np.nan)
+    has = counts > 0
+    lo = starts[has] + (counts[has] - 1) // 2
+    hi = starts[has] + counts[has] // 2
+    medians[has] = (sorted_values[lo] + sorted_values[hi]) / 2
+    return medians
+
+
+def detect(days: np.ndarray, amounts: np.ndarray, keys: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Analisa todas as séries de uma vez.
+    Args:
+        days: número de dias de cada transação
+        amounts: valores em centavos (apenas saídas, negativos)
+        keys: merchant_id de cada transação
+    Returns:
+        arrays por grupo (key, count, period, median_amount, mad, last_day)
+        e `outliers`, máscara booleana na ordem original das linhas
+    """
+    n = len(days)
+    if n == 0:
+        empty = np.array([], dtype=np.int64)
+        return {'key': empty, 'count': empty, 'period': empty, 'median_amount': empty.astype(float),
+                'mad': empty.astype(float), 'last_day': empty, 'outliers': np.zeros(0, dtype=bool)}
+
+    order = np.lexsort((days, keys))
+    k, d, a = keys[order], days[order], amounts[order]
+
+    starts = np.concatenate(([0], np.flatnonzero(k[1:] != k[:-1]) + 1))
+    counts = np.diff(np.concatenate((starts, [n])))
+    n_groups = len(starts)
+    group = np.repeat(np.arange(n_groups), counts)
+
+    # Intervalos entre cobranças consecutivas do mesmo merchant
+    gaps = np.diff(d)
+    same = (group[1:] == group[:-1]) & (gaps > 0)
+    gaps, gap_group = gaps[same], group[1:][same]
+    n_gaps = np.bincount(gap_group, minlength=n_groups)
+    median_gap = _group_median(gaps.astype(float), gap_group, n_groups)
+
+    period = np.zeros(n_groups, dtype=np.int64)
+    for length, tolerance, min_count in PERIODS.values():
+        fits = np.abs(gaps - length) <= tolerance
+        regularity = np.bincount(gap_group, weights=fits, minlength=n_groups) / np.maximum(n_gaps, 1)
+        found = ((period == 0) & (counts >= min_count) & (np.abs(median_gap - length) <= tolerance)
+                 & (regularity >= MIN_REGULARITY))
+        period[found] = length
+
+    # Mediana e MAD dos valores por merchant
+    median_amount = _group_median(a.astype(float), group, n_groups)
+    deviation = np.abs(a - median_amount[group])
+    mad = _group_median(deviation, group, n_groups)
+
+    scaled_mad = 1.4826 * mad[group]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = np.where(scaled_mad > 0, deviation / scaled_mad, 0.0)
+    outlier_sorted = (counts[group] >= MIN_HISTORY) & np.where(
+        scaled_mad > 0, z > OUTLIER_Z, deviation > np.maximum(MIN_FIXED_DEVIATION, 0.05 * np.abs(median_amount[group]))
+    )
+    outliers = np.zeros(n, dtype=bool)
+    outliers[order] = outlier_sorted
+
+    return {
+        'key': k[starts],
+        'count': counts,
+        'period': period,
+        'median_amount': median_amount,
+        'mad': mad,
+        'last_day': d[starts + counts - 1],
+        'outliers': outliers,
+    }
+
+
+class RecurringDetector:
+    """Mantém os padrões recorrentes de cada usuário na tabela recurring_patterns"""
+
+    def __init__(self, db: DatabaseManager, archive: TransactionArchive = None):
+        self.db = db
+        self.archive = archive or TransactionArchive(db)
+
+    def scan(self, user_id: int, mark_notified: bool = True) -> Dict[str, List[Dict]]:
+        """
+        Varredura completa do histórico (primeira execução ou reprocessamento).
+        Com mark_notified=False, os padrões encontrados ficam pendentes e são
+        avisados ao usuário junto com a próxima importação.
+        """
+        return self._run(user_id, None, None, mark_notified)
+
+    def scan_all(self) -> Dict[str, int]:
+        """Varre todos os usuários sem marcar os padrões como avisados"""
+        stats = {'users': 0, 'patterns': 0}
+        for user_id in self.db.get_user_ids():
+            stats['users'] += 1
+            stats['patterns'] += len(self.scan(user_id, mark_notified=False)['recurring'])
+        return stats
+
+    def update(self, user_id: int, new_transactions: List[TransactionRecord]) -> Dict[str, List[Dict]]:
+        """Recalcula só os merchants presentes nas transações recém-gravadas"""
+        merchant_ids = sorted({t['merchant_id'] for t in new_transactions
+                               if t.get('merchant_id') is not None and t['amount'] < 0})
+        if not merchant_ids:
+            return {'recurring': [], 'anomalies': []}
+        new_keys = {(t['merchant_id'], t['date'], t['amount']) for t in new_transactions}
+        return self._run(user_id, merchant_ids, new_keys)
+
+    def _run(self, user_id: int, merchant_ids: Optional[List[int]], new_keys: Optional[set],
+             mark_notified: bool = True) -> Dict[str, List[Dict]]:
+        arrays = self.archive.load_expense_arrays(user_id, merchant_ids)
+        days, amounts, keys = arrays['date'], arrays['amount'], arrays['merchant_id']
+        result = detect(days, amounts, keys)
+
+        # Na atualização, só as linhas novas geram alerta de valor;
+        # na varredura completa, só os últimos RECENT_DAYS
+        flagged = np.flatnonzero(result['outliers'])
+        if new_keys is not None:
+            flagged = [i for i in flagged if (int(keys[i]), int(days[i]), int(amounts[i])) in new_keys]
+        elif len(flagged):
+            flagged = flagged[days[flagged] >= days.max() - RECENT_DAYS]
+        group_index = {int(key): i for i, key in enumerate(result['key'])}
+        anomalies = [{
+            'merchant_id': int(keys[i]),
+            'date': int(days[i]),
+            'amount': int(amounts[i]),
+            'expected': int(round(result['median_amount'][group_index[int(keys[i])]]))
+        } for i in flagged]
+
+        recurring = self._save_patterns(user_id, result, merchant_ids, mark_notified)
+        return {'recurring': recurring, 'anomalies': anomalies}
+
+    def _save_patterns(self, user_id: int, result: Dict[str, np.ndarray],
+                       merchant_ids: Optional[List[int]], mark_notified: bool = True) -> List[Dict]:
+        """Grava padrões e devolve os que ainda não foram notificados"""
+        periodic = np.flatnonzero(result['period'] > 0)
+        rows = [(
+            user_id,
+            int(result['key'][i]),
+            int(result['period'][i]),
+            int(result['count'][i]),
+            int(round(result['median_amount'][i])),
+            int(result['last_day'][i]),
+            int(result['last_day'][i] + result['period'][i])
+        ) for i in periodic]
+
+        with self.db._get_connection(user_id) as conn:
+            # Merchants recalculados que deixaram de ser periódicos
+            scope = merchant_ids if merchant_ids is not None else [
+                r[0] for r in conn.execute('SELECT merchant_id FROM recurring_patterns WHERE user_id = ?', (user_id,))
+            ]
+            still_periodic = {r[1] for r in rows}
+            conn.executemany('DELETE FROM recurring_patterns WHERE user_id = ? AND merchant_id = ?',
+                             [(user_id, m) for m in scope if m not in still_periodic])
+            conn.executemany('''
+                INSERT INTO recurring_patterns
+                (user_id, merchant_id, period_days, occurrences, amount, last_day, next_day, notified)
+                VALUES (?, ?, ?, ?, ?, ?, ?, 0)
+                ON CONFLICT (user_id, merchant_id) DO UPDATE SET
+                    period_days = excluded.period_days,
+                    occurrences = excluded.occurrences,
+                    amount = excluded.amount,
+                    last_day = excluded.last_day,
+                    next_day = excluded.next_day
+            ''', rows)
+            pending = [dict(r) for r in conn.execute('''
+                SELECT p.merchant_id, m.name, p.period_days, p.occurrences, p.amount, p.next_day
+                FROM recurring_patterns p JOIN merchants m ON m.id = p.merchant_id
+                WHERE p.user_id = ? AND p.notified = 0
+            ''', (user_id,))]
+            if mark_notified:
+                conn.execute('UPDATE recurring_patterns SET notified = 1 WHERE user_id = ? AND notified = 0',
+                             (user_id,))
+            conn.commit()
+        return pending
+
+    def get_patterns(self, user_id: int) -> List[Dict]:
+        """Cobranças recorrentes conhecidas do usuário"""
+        with self.db._get_connection(user_id) as conn:
+            return [dict(r) for r in conn.execute('''
+                SELECT p.merchant_id, m.name, p.period_days, p.occurrences, p.amount, p.next_day
+                FROM recurring_patterns p JOIN merchants m ON m.id = p.merchant_id
+                WHERE p.user_id = ?
+                ORDER BY p.next_day
+            ''', (user_id,))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Detecta cobranças recorrentes nos históricos existentes")
+    parser.add_argument('--user', type=int, help="Varre apenas este usuário")
+    args = parser.parse_args()
+
+    detector = RecurringDetector(DatabaseManager())
+    if args.user is not None:
+        stats = {'users': 1, 'patterns': len(detector.scan(args.user, mark_notified=False)['recurring'])}
+    else:
+        stats = detector.scan_all()
+    print(f"{stats['users']} usuários varridos, {stats['patterns']} cobranças recorrentes a avisar")
+    detector.db.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
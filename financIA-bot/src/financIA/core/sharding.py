@@ -0,0 +1,233 @@
+"""
+Particionamento do banco por usuário.
+
+Cada user_id é roteado por hash consistente para um de N arquivos
+(`DB_SHARD_MODE=hash`) ou para um arquivo próprio (`DB_SHARD_MODE=user`).
+O banco principal (DB_PATH) continua com as tabelas globais (merchants) e é
+anexado como `catalog` nas conexões de cada shard.
+
+Após mudar DB_SHARD_MODE/DB_SHARDS, ou para sair do arquivo único,
+redistribua os usuários com o bot parado:
+    python -m src.financIA.core.sharding rebalance
+    python -m src.financIA.core.sharding stats
+"""
+import argparse
+import bisect
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List
+
+if TYPE_CHECKING:
+    from src.financIA.core.database import DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+# Pontos de cada shard no anel; mais pontos = distribuição mais uniforme
+VIRTUAL_NODES = 64
+
+
+def stable_hash(key: str) -> int:
+    """Hash estável entre processos (hash() do Python é aleatorizado)"""
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """
+    Anel de hash consistente: ao passar de N para N+1 shards, só ~1/(N+1)
+    dos usuários muda de arquivo.
+    """
+
+    def __init__(self, nodes: Iterable[str], vnodes: int = VIRTUAL_NODES):
+        points = sorted(
+            (stable_hash(f"{node}#{i}"), node) for node in nodes for i in range(vnodes)
+        )
+        if not points:
+            raise ValueError("O anel precisa de pelo menos um shard")
+        self._hashes = [h for h, _ in points]
+        self._nodes = [n for _, n in points]
+
+    def node_for(self, key: str) -> str:
+        i = bisect.bisect(self._hashes, stable_hash(key)) % len(self._hashes)
+        return self._nodes[i]
+
+
+class ConnectionCache:
+    """
+    Conexões ociosas por arquivo, com despejo LRU.
+
+    Uma conexão é usada por uma thread de cada vez: acquire() a retira do
+    cache e release() a devolve. Acima de `max_open` conexões ociosas, as do
+    arquivo usado há mais tempo são fechadas.
+    """
+
+    def __init__(self, connect: Callable[[str], sqlite3.Connection], max_open: int):
+        self._connect = connect
+        self.max_open = max(max_open, 1)
+        self._idle: "OrderedDict[str, List[sqlite3.Connection]]" = OrderedDict()
+        self._idle_count = 0
+        self._lock = threading.Lock()
+        self._metrics = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def acquire(self, path: str) -> sqlite3.Connection:
+        with self._lock:
+            conns = self._idle.get(path)
+            if conns:
+                conn = conns.pop()
+                self._idle_count -= 1
+                self._idle.move_to_end(path)
+                self._metrics['hits'] += 1
+                return conn
+            self._metrics['misses'] += 1
+        return self._connect(path)
+
+    def release(self, path: str, conn: sqlite3.Connection) -> None:
+        with self._lock:
+            self._idle.setdefault(path, []).append(conn)
+            self._idle.move_to_end(path)
+            self._idle_count += 1
+            evicted = self._evict()
+        for old in evicted:
+            old.close()
+
+    def _evict(self) -> List[sqlite3.Connection]:
+        evicted = []
+        while self._idle_count > self.max_open:
+            path, conns = next(iter(self._idle.items()))
+            evicted.append(conns.pop(0))
+            self._idle_count -= 1
+            if not conns:
+                del self._idle[path]
+        self._metrics['evictions'] += len(evicted)
+        return evicted
+
+    def close_all(self) -> None:
+        with self._lock:
+            conns = [c for cs in self._idle.values() for c in cs]
+            self._idle.clear()
+            self._idle_count = 0
+        for conn in conns:
+            conn.close()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._metrics, 'idle': self._idle_count, 'files': len(self._idle)}
+
+
+# --- Redistribuição ---
+
+def rebalance(db: "DatabaseManager", dry_run: bool = False) -> Dict[str, int]:
+    """
+    Move cada usuário para o shard definido pela configuração atual,
+    a partir do arquivo único ou de um layout anterior de shards.
+    Pode ser repetido: linhas já copiadas não são duplicadas.
+    """
+    stats = {'users': 0, 'transactions': 0}
+    for source in db.shard_paths():
+        with db._connect(source) as conn:
+            users = db._user_ids(conn)
+        for user_id in users:
+            target = db.shard_path(user_id)
+            if target == source:
+                continue
+            stats['users'] += 1
+            if dry_run:
+                logger.info(f"Usuário {user_id}: {source} -> {target}")
+                continue
+            stats['transactions'] += move_user(db, user_id, source, target)
+    return stats
+
+
+def move_user(db: "DatabaseManager", user_id: int, source: str, target: str) -> int:
+    """Copia todas as linhas do usuário de `source` para `target` e as apaga da origem"""
+    from src.financIA.core import migrations
+
+    # Garante o esquema no destino antes de anexar a origem
+    with db._connect(target):
+        pass
+
+    conn = sqlite3.connect(target, timeout=30, isolation_level=None)
+    try:
+        conn.execute("ATTACH DATABASE ? AS src", (source,))
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            moved = _copy_transactions(conn, user_id)
+            for table in migrations.USER_TABLES:
+                if table == 'transactions':
+                    continue
+                columns = ', '.join(row[1] for row in conn.execute(f"PRAGMA main.table_info({table})"))
+                conn.execute(f'''
+                    INSERT OR REPLACE INTO main.{table} ({columns})
+                    SELECT {columns} FROM src.{table} WHERE user_id = ?
+                ''', (user_id,))
+            for table in migrations.USER_TABLES:
+                conn.execute(f"DELETE FROM src.{table} WHERE user_id = ?", (user_id,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("DETACH DATABASE src")
+    finally:
+        conn.close()
+    logger.info(f"Usuário {user_id}: {moved} transações movidas de {source} para {target}")
+    return moved
+
+
+def _copy_transactions(conn: sqlite3.Connection, user_id: int) -> int:
+    columns = [row[1] for row in conn.execute("PRAGMA main.table_info(transactions)") if row[1] != 'id']
+    column_list = ', '.join(columns)
+    # Os ids são preservados (o arquivo Parquet deduplica por id); se o id já
+    # pertence a outra linha no destino, a linha recebe um novo
+    before = conn.total_changes
+    conn.execute(f'''
+        INSERT INTO main.transactions (id, {column_list})
+        SELECT CASE WHEN EXISTS (SELECT 1 FROM main.transactions m WHERE m.id = s.id)
+                    THEN NULL ELSE s.id END,
+               {', '.join(f's.{c}' for c in columns)}
+        FROM src.transactions s
+        WHERE s.user_id = ? AND NOT EXISTS (
+            SELECT 1 FROM main.transactions m WHERE m.id = s.id AND m.user_id = s.user_id
+        )
+        ORDER BY s.id
+    ''', (user_id,))
+    moved = conn.total_changes - before
+    # Ids novos no destino ficam acima de tudo que a origem já emitiu
+    conn.execute('''
+        UPDATE main.sqlite_sequence
+        SET seq = MAX(seq, COALESCE((SELECT seq FROM src.sqlite_sequence WHERE name = 'transactions'), 0))
+        WHERE name = 'transactions'
+    ''')
+    return moved
+
+
+def main() -> None:
+    from src.financIA.core.database import DatabaseManager
+
+    parser = argparse.ArgumentParser(description="Administra os shards do banco de transações")
+    commands = parser.add_subparsers(dest='command', required=True)
+    rebalance_parser = commands.add_parser('rebalance', help="Move usuários para o shard configurado")
+    rebalance_parser.add_argument('--dry-run', action='store_true', help="Apenas lista os usuários a mover")
+    rebalance_parser.add_argument('--vacuum', action='store_true', help="Compacta os arquivos ao final")
+    commands.add_parser('stats', help="Usuários, transações e tamanho de cada arquivo")
+    args = parser.parse_args()
+
+    db = DatabaseManager()
+    if args.command == 'rebalance':
+        stats = rebalance(db, dry_run=args.dry_run)
+        verb = "a mover" if args.dry_run else "movidos"
+        print(f"{stats['users']} usuários {verb}, {stats['transactions']} transações copiadas")
+        if args.vacuum and not args.dry_run:
+            db.vacuum()
+    else:
+        for row in db.get_shard_stats():
+            print(f"{Path(row['path']).name}: {row['users']} usuários, "
+                  f"{row['transactions']} transações, {row['size'] / 1024:.0f} KiB")
+    db.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
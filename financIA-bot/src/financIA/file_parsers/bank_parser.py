@@ -2,21 +2,84 @@ from enum import Enum
 import pandas as pd
 from abc import ABC, abstractmethod
 
+from ..core.records import TransactionRecord, normalize_transaction
+
 class BankType(Enum):
     ITAU = 'Itaú'
     BRADESCO = 'Bradesco'
     SANTANDER = 'Santander'
 
 class BankParser(ABC):
+    # Nomes de coluna aceitos para cada campo (comparação sem maiúsculas)
+    DATE_COLUMNS = ('data', 'date', 'data lançamento')
+    DESCRIPTION_COLUMNS = ('descrição', 'descricao', 'lançamento', 'histórico', 'description')
+    AMOUNT_COLUMNS = ('valor', 'valor (r$)', 'amount')
+    ID_COLUMNS = ('identificador', 'id', 'documento')
+
+    # Exportações recentes vêm em UTF-8 (às vezes com BOM); as antigas, em latin-1
+    ENCODINGS = ('utf-8-sig', 'iso-8859-1')
+
     @abstractmethod
-    def parse(self, file_path: str) -> list[dict]:
+    def parse(self, file_path: str) -> list[TransactionRecord]:
         pass
 
+    def _read_csv(self, file_path: str, **kwargs) -> pd.DataFrame:
+        """Lê o CSV tentando cada codificação de ENCODINGS"""
+        for encoding in self.ENCODINGS[:-1]:
+            try:
+                return pd.read_csv(file_path, encoding=encoding, dtype=str, **kwargs)
+            except UnicodeDecodeError:
+                continue
+        return pd.read_csv(file_path, encoding=self.ENCODINGS[-1], dtype=str, **kwargs)
+
+    def _normalize_frame(self, df: pd.DataFrame, bank_type: BankType) -> list[TransactionRecord]:
+        """Converte o DataFrame do banco em TransactionRecords"""
+        columns = {str(c).strip().lower(): c for c in df.columns}
+
+        def find(candidates, required=True):
+            for name in candidates:
+                if name in columns:
+                    return columns[name]
+            if required:
+                raise ValueError(f"Coluna obrigatória ausente: {candidates[0]}")
+            return None
+
+        date_col = find(self.DATE_COLUMNS)
+        desc_col = find(self.DESCRIPTION_COLUMNS)
+        amount_col = find(self.AMOUNT_COLUMNS)
+        id_col = find(self.ID_COLUMNS, required=False)
+
+        records = []
+        df = df.astype(object).where(df.notna(), None)
+        for values in df.to_dict('records'):
+            if values[date_col] is None or values[amount_col] is None:
+                continue
+            records.append(normalize_transaction(
+                values[date_col],
+                values[desc_col],
+                values[amount_col],
+                source=bank_type.value,
+                external_id=values[id_col] if id_col is not None else None
+            ))
+        return records
+
 class ItauParser(BankParser):
-    def parse(self, file_path: str) -> list[dict]:
-        df = pd.read_csv(file_path, encoding='iso-8859-1')
-        # Implemente a lógica específica para Itaú
-        return df.to_dict('records')
+    def parse(self, file_path: str) -> list[TransactionRecord]:
+        df = self._read_csv(file_path)
+        return self._normalize_frame(df, BankType.ITAU)
+
+class BradescoParser(BankParser):
+    def parse(self, file_path: str) -> list[TransactionRecord]:
+        df = self._read_csv(file_path, sep=';')
+        return self._normalize_frame(df, BankType.BRADESCO)
+
+class SantanderParser(BankParser):
+    def parse(self, file_path: str) -> list[TransactionRecord]:
+        if str(file_path).lower().endswith(('.xlsx', '.xls')):
+            df = pd.read_excel(file_path, dtype=str)
+        else:
+            df = self._read_csv(file_path, sep=';')
+        return self._normalize_frame(df, BankType.SANTANDER)
 
 class BankParserFactory:
     @staticmethod
@@ -26,4 +89,4 @@ class BankParserFactory:
             BankType.BRADESCO: BradescoParser(),
             BankType.SANTANDER: SantanderParser()
         }
-        return parsers[bank_type]
\ No newline at end of file
+        return parsers[bank_type]
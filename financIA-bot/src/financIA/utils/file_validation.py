@@ -1,11 +1,7 @@
-from enum import Enum
 import pandas as pd
 from pathlib import Path
 
-class BankType(Enum):
-    ITAU = 'Itaú'
-    BRADESCO = 'Bradesco'
-    SANTANDER = 'Santander'
+from ..file_parsers.bank_parser import BankType
 
 def validate_bank_statement(file_path: str) -> BankType:
     """Valida e identifica o tipo de extrato bancário"""
@@ -13,7 +9,7 @@ def validate_bank_statement(file_path: str) -> BankType:
         raise ValueError("Arquivo não encontrado")
     
     # Verifica extensão
-    if not file_path.lower().endswith(('.csv', '.xlsx')):
+    if not str(file_path).lower().endswith(('.csv', '.xlsx')):
         raise ValueError("Formato inválido. Use CSV ou XLSX")
     
     # Detecta o banco pelo conteúdo
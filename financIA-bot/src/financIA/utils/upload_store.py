@@ -0,0 +1,159 @@
+import hashlib
+import logging
+import os
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from ..config import Config
+from ..core.database import DatabaseManager
+from ..core.records import TransactionRecord
+
+logger = logging.getLogger(__name__)
+
+
+def file_sha256(file_path: str) -> str:
+    """Hash SHA-256 do conteúdo, lido em blocos"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def row_fingerprints(records: List[TransactionRecord]) -> List[str]:
+    """Identidade de cada linha para detectar sobreposição entre extratos"""
+    fingerprints = []
+    seen = Counter()
+    for r in records:
+        if r.get('external_id'):
+            base = f"id:{r['external_id']}"
+        else:
+            description = ' '.join(r['description'].upper().split())
+            base = hashlib.sha1(f"{r['date']}|{r['amount']}|{description}".encode()).hexdigest()
+        # Lançamentos idênticos no mesmo dia continuam distintos pela ordem
+        seen[base] += 1
+        fingerprints.append(f"{base}#{seen[base]}")
+    return fingerprints
+
+
+class UploadStore:
+    """Armazena extratos por conteúdo e lembra o que já foi importado"""
+
+    def __init__(self, db: DatabaseManager, uploads_dir: str = None,
+                 max_files_per_user: int = None, retention_days: int = None):
+        self.db = db
+        self.uploads_dir = Path(uploads_dir or Config.UPLOADS_DIR)
+        self.max_files_per_user = max_files_per_user or Config.UPLOAD_MAX_FILES_PER_USER
+        self.retention_days = retention_days or Config.UPLOAD_RETENTION_DAYS
+
+    # --- Deduplicação por arquivo ---
+
+    def find_by_file_unique_id(self, user_id: int, file_unique_id: str) -> Optional[Dict]:
+        """Resultado anterior para o mesmo arquivo do Telegram (antes do download)"""
+        with self.db._get_connection(user_id) as conn:
+            row = conn.execute('''
+                SELECT * FROM uploads WHERE user_id = ? AND file_unique_id = ?
+            ''', (user_id, file_unique_id)).fetchone()
+        return dict(row) if row else None
+
+    def find_by_hash(self, user_id: int, sha256: str) -> Optional[Dict]:
+        """Resultado anterior para o mesmo conteúdo"""
+        with self.db._get_connection(user_id) as conn:
+            row = conn.execute('''
+                SELECT * FROM uploads WHERE user_id = ? AND sha256 = ?
+            ''', (user_id, sha256)).fetchone()
+        return dict(row) if row else None
+
+    def staging_path(self, user_id: int, suffix: str) -> Path:
+        """Caminho temporário para o download, antes de conhecer o hash"""
+        user_dir = self.uploads_dir / str(user_id)
+        user_dir.mkdir(parents=True, exist_ok=True)
+        return user_dir / f".recebendo_{time.time_ns()}{suffix}"
+
+    def store(self, user_id: int, staged_path: Path) -> Tuple[str, Path]:
+        """Move o arquivo baixado para seu endereço de conteúdo"""
+        sha256 = file_sha256(staged_path)
+        final_path = staged_path.parent / f"{sha256}{staged_path.suffix}"
+        if final_path.exists():
+            staged_path.unlink()
+        else:
+            os.replace(staged_path, final_path)
+        return sha256, final_path
+
+    def register(self, user_id: int, sha256: str, file_unique_id: str, path: Path,
+                 bank: str, total_rows: int, imported_rows: int) -> None:
+        """Grava o resultado da importação para respostas futuras"""
+        with self.db._get_connection(user_id) as conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO uploads
+                (user_id, sha256, file_unique_id, path, size, bank, total_rows, imported_rows, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (user_id, sha256, file_unique_id, str(path), path.stat().st_size,
+                  bank, total_rows, imported_rows, int(time.time())))
+            conn.commit()
+
+    def remember_file_id(self, user_id: int, sha256: str, file_unique_id: str) -> None:
+        """Associa outro file_unique_id a um conteúdo já conhecido"""
+        with self.db._get_connection(user_id) as conn:
+            conn.execute('''
+                UPDATE uploads SET file_unique_id = ? WHERE user_id = ? AND sha256 = ?
+            ''', (file_unique_id, user_id, sha256))
+            conn.commit()
+
+    # --- Sobreposição por linha ---
+
+    def filter_new_rows(self, user_id: int,
+                        records: List[TransactionRecord]) -> Tuple[List[TransactionRecord], List[str]]:
+        """
+        Descarta linhas já importadas; devolve as novas e suas impressões digitais,
+        que DatabaseManager.save_transactions grava junto com as linhas
+        """
+        if not records:
+            return [], []
+        # Calculadas sobre o lote inteiro para manter a numeração de repetidas
+        fingerprints = row_fingerprints(records)
+        with self.db._get_connection(user_id) as conn:
+            conn.execute('CREATE TEMP TABLE IF NOT EXISTS incoming (fingerprint TEXT PRIMARY KEY)')
+            conn.execute('DELETE FROM incoming')
+            conn.executemany('INSERT OR IGNORE INTO incoming VALUES (?)', ((f,) for f in fingerprints))
+            known = {row[0] for row in conn.execute('''
+                SELECT i.fingerprint FROM incoming i
+                JOIN imported_rows r ON r.user_id = ? AND r.fingerprint = i.fingerprint
+            ''', (user_id,))}
+        new = [(r, f) for r, f in zip(records, fingerprints) if f not in known]
+        return [r for r, _ in new], [f for _, f in new]
+
+    # --- Retenção ---
+
+    def enforce_retention(self, user_id: int) -> int:
+        """Apaga arquivos antigos ou excedentes; o histórico de hashes é mantido"""
+        cutoff = int(time.time()) - self.retention_days * 86400
+        with self.db._get_connection(user_id) as conn:
+            rows = conn.execute('''
+                SELECT sha256, path, created_at FROM uploads
+                WHERE user_id = ? AND path IS NOT NULL
+                ORDER BY created_at DESC
+            ''', (user_id,)).fetchall()
+            expired = [r for i, r in enumerate(rows)
+                       if i >= self.max_files_per_user or r['created_at'] < cutoff]
+            for r in expired:
+                try:
+                    Path(r['path']).unlink(missing_ok=True)
+                except OSError as e:
+                    logger.warning(f"Não foi possível remover {r['path']}: {str(e)}")
+                    continue
+                conn.execute('UPDATE uploads SET path = NULL WHERE user_id = ? AND sha256 = ?',
+                             (user_id, r['sha256']))
+            conn.commit()
+            kept = {r['path'] for r in rows if r not in expired}
+
+        # Downloads interrompidos e extratos rejeitados não ficam registrados
+        removed = len(expired)
+        user_dir = self.uploads_dir / str(user_id)
+        for path in user_dir.glob('*') if user_dir.exists() else []:
+            if path.is_file() and str(path) not in kept and path.stat().st_mtime < time.time() - 3600:
+                path.unlink(missing_ok=True)
+                removed += 1
+        return removed
@@ -2,6 +2,7 @@ import requests
 from datetime import datetime
 from typing import List, Dict
 import logging
+from src.financIA.core.records import TransactionRecord, normalize_transaction
 
 logger = logging.getLogger(__name__)
 
@@ -53,12 +54,12 @@ class OpenFinanceIntegration:
             logger.error(f"Erro no Open Finance: {str(e)}")
             raise
 
-    def _normalize_data(self, raw_transactions: List) -> List[Dict]:
+    def _normalize_data(self, raw_transactions: List) -> List[TransactionRecord]:
         """Padroniza formato das transações"""
-        return [{
-            'date': datetime.strptime(t['bookingDate'], '%Y-%m-%d').strftime('%Y-%m-%d'),
-            'description': t.get('remittanceInformation', ''),
-            'value': float(t['amount']),
-            'source': 'open_finance',
-            'metadata': {'transactionId': t['transactionId']}
-        } for t in raw_transactions]
\ No newline at end of file
+        return [normalize_transaction(
+            t['bookingDate'],
+            t.get('remittanceInformation', ''),
+            t['amount'],
+            source='open_finance',
+            external_id=t['transactionId']
+        ) for t in raw_transactions]
\ No newline at end of file
@@ -1,18 +1,36 @@
 from ..integrations.open_finance import OpenFinanceIntegration
 from src.financIA.core.categorizer import SmartCategorizer
-from typing import Union, List, Dict  # Importação consolidada
+from src.financIA.core.records import TransactionRecord
+from src.financIA.core.archive import TransactionArchive
+from src.financIA.core.merchants import MerchantIndex
+from src.financIA.core.recurring import RecurringDetector
+from src.financIA.file_parsers.bank_parser import BankParserFactory
+from src.financIA.utils.upload_store import UploadStore
+from typing import Union, List, Dict, Tuple  # Importação consolidada
+import threading
 
 class AnalysisService:
-    def __init__(self, db_manager, of_client: Union[OpenFinanceIntegration, None] = None):
+    def __init__(self, db_manager, of_client: Union[OpenFinanceIntegration, None] = None,
+                 archive: Union[TransactionArchive, None] = None,
+                 uploads: Union[UploadStore, None] = None):
         self.db = db_manager
         self.of_client = of_client
+        self.archive = archive or TransactionArchive(db_manager)
+        self.uploads = uploads or UploadStore(db_manager)
+        self.merchants = MerchantIndex(db_manager)
+        self.recurring = RecurringDetector(db_manager, self.archive)
+        self._findings: Dict[int, Dict[str, List[Dict]]] = {}
+        # Importações do mesmo usuário são serializadas; de usuários distintos, paralelas
+        self._user_locks: Dict[int, threading.Lock] = {}
+        self._user_locks_guard = threading.Lock()
         self.categorizer = SmartCategorizer('bert_model')
     
-    def process_source(self, source_type: str, **kwargs):
+    def process_source(self, source_type: str, user_id: int = None, **kwargs):
         """
         Processa dados de qualquer fonte
         Args:
             source_type: 'open_finance' ou 'file'
+            user_id: dono das transações gravadas
             kwargs:
                 - Para Open Finance: account_id, start_date, end_date
                 - Para arquivos: file_path, bank_type
@@ -29,17 +47,92 @@ class AnalysisService:
                 kwargs['bank_type']
             )
         
-        return self._process_transactions(transactions)
+        return self._process_transactions(transactions, user_id)
 
-    def _process_transactions(self, transactions: List[Dict]) -> int:
+    def process_file(self, file_path, bank_type, user_id: int) -> Dict[str, int]:
+        """Importa um extrato; linhas já vistas em importações anteriores são ignoradas"""
+        transactions = self._parse_file(file_path, bank_type)
+        imported = self._process_transactions(transactions, user_id)
+        return {'total_rows': len(transactions), 'imported_rows': imported}
+
+    def pop_findings(self, user_id: int) -> Dict[str, List[Dict]]:
+        """Recorrências novas e valores anômalos desde a última consulta"""
+        return self._findings.pop(user_id, {'recurring': [], 'anomalies': []})
+
+    def monthly_summary(self, user_id: int) -> List[Dict]:
+        """Entradas, saídas e saldo por mês, incluindo meses arquivados"""
+        return [{
+            'month': m['month'],
+            'income': m['income'] / 100,
+            'expenses': m['expenses'] / 100,
+            'net': (m['income'] + m['expenses']) / 100,
+            'count': m['count']
+        } for m in self.archive.get_monthly_totals(user_id)]
+
+    def top_merchants(self, user_id: int, start_day: int = None, end_day: int = None,
+                      limit: int = 10) -> List[Dict]:
+        """Contrapartes com maior gasto no período"""
+        return [{
+            'merchant_id': m['merchant_id'],
+            'name': self.merchants.name(m['merchant_id']),
+            'total': -m['total'] / 100,
+            'count': m['count']
+        } for m in self.archive.get_spending_by_merchant(user_id, start_day, end_day, limit)]
+
+    def recurring_charges(self, user_id: int) -> List[Dict]:
+        """Cobranças recorrentes conhecidas, da próxima para a mais distante"""
+        return self.recurring.get_patterns(user_id)
+
+    def _parse_file(self, file_path, bank_type) -> List[TransactionRecord]:
+        """Lê o extrato com o parser do banco (já normalizado)"""
+        return BankParserFactory.get_parser(bank_type).parse(str(file_path))
+
+    def _user_lock(self, user_id: int) -> threading.Lock:
+        with self._user_locks_guard:
+            return self._user_locks.setdefault(user_id, threading.Lock())
+
+    def _process_transactions(self, transactions: List[TransactionRecord], user_id: int = None) -> int:
         """Processamento comum para todas as fontes"""
+        with self._user_lock(user_id):
+            return self._import(transactions, user_id)
+
+    def _import(self, transactions: List[TransactionRecord], user_id: int = None) -> int:
+        fingerprints = []
+        if user_id is not None:
+            # Só categoriza e grava o que ainda não foi importado
+            transactions, fingerprints = self.uploads.filter_new_rows(user_id, transactions)
+
+        merchant_ids = self.merchants.resolve_many([t['description'] for t in transactions])
         categorized = []
-        for t in transactions:
-            t['category'] = self.categorizer.categorize(
-                t['description'],
-                t.get('bank_type')
-            )
+        new_categories: Dict[Tuple[int, bool], str] = {}
+        for t, merchant_id in zip(transactions, merchant_ids):
+            t['merchant_id'] = merchant_id
+            # Categoria memorizada por merchant e sentido: o modelo roda uma vez
+            # para as saídas e uma para as entradas de cada contraparte
+            key = (merchant_id, t['amount'] > 0)
+            category = None
+            if merchant_id:
+                category = self.merchants.category(*key) or new_categories.get(key)
+            if category is None:
+                category = self.categorizer.categorize(
+                    t['description'],
+                    t.get('bank_type')
+                )
+                if merchant_id:
+                    new_categories[key] = category
+            t['category'] = category
             categorized.append(t)
+        if new_categories:
+            self.merchants.set_categories(new_categories)
         
-        self.db.save_transactions(categorized)
-        return len(categorized)
\ No newline at end of file
+        self.db.save_transactions(categorized, user_id, fingerprints)
+        if user_id is not None and categorized:
+            self._collect_findings(user_id, self.recurring.update(user_id, categorized))
+        return len(categorized)
+
+    def _collect_findings(self, user_id: int, findings: Dict[str, List[Dict]]) -> None:
+        pending = self._findings.setdefault(user_id, {'recurring': [], 'anomalies': []})
+        pending['recurring'].extend(findings['recurring'])
+        pending['anomalies'].extend(
+            {**a, 'name': self.merchants.name(a['merchant_id'])} for a in findings['anomalies']
+        )
\ No newline at end of file
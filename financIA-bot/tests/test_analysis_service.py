@@ -0,0 +1,50 @@
+import pytest
+
+from src.financIA.core.archive import TransactionArchive
+from src.financIA.core.database import DatabaseManager
+from src.financIA.core.merchants import MerchantIndex
+from src.financIA.core.records import normalize_transaction
+from src.financIA.utils.upload_store import UploadStore
+from src.services.analysis_service import AnalysisService
+
+
+class RecordingCategorizer:
+    def __init__(self):
+        self.calls = []
+
+    def categorize(self, description, bank_type=None):
+        self.calls.append(description)
+        return "Renda" if "RECEBIDO" in description else "Transferências"
+
+
+@pytest.fixture
+def service(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'transactions.db'), shard_mode='single')
+    service = AnalysisService(db, None, TransactionArchive(db, str(tmp_path / 'archive')),
+                              UploadStore(db, str(tmp_path / 'uploads')))
+    service.categorizer = RecordingCategorizer()
+    yield service
+    db.close()
+
+
+def record(day, description, amount):
+    return normalize_transaction(day, description, amount, source='file')
+
+
+def test_category_is_memoized_per_merchant_and_direction(service):
+    service._process_transactions([
+        record('2025-03-01', 'PIX ENVIADO JOAO S', '-50'),
+        record('2025-03-02', 'PIX RECEBIDO JOAO S', '80'),
+        record('2025-03-03', 'PIX ENVIADO JOAO S 03/03', '-20'),
+    ], 1)
+    service._process_transactions([record('2025-03-10', 'PIX RECEBIDO JOAO S', '30')], 1)
+
+    rows = service.db.get_transactions_between(1, 0, 10 ** 6)
+    assert len({r['merchant_id'] for r in rows}) == 1
+    assert [(r['amount'], r['category']) for r in rows] == [
+        (-5000, "Transferências"), (8000, "Renda"), (-2000, "Transferências"), (3000, "Renda"),
+    ]
+    assert service.categorizer.calls == ['PIX ENVIADO JOAO S', 'PIX RECEBIDO JOAO S']
+    # Memória sobrevive a um novo índice carregado do banco
+    service.merchants.flush()
+    assert MerchantIndex(service.db).category(rows[0]['merchant_id'], income=True) == "Renda"
@@ -0,0 +1,130 @@
+import pytest
+
+from src.financIA.core.archive import TransactionArchive
+from src.financIA.core.database import DatabaseManager
+from src.financIA.core.records import normalize_transaction, to_day_number
+
+pytest.importorskip('pyarrow')
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'transactions.db'), shard_mode='single')
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def archive(db, tmp_path):
+    return TransactionArchive(db, str(tmp_path / 'archive'))
+
+
+def record(day, description, amount, merchant_id=None):
+    row = normalize_transaction(day, description, amount, source='file', user_id=1)
+    row['merchant_id'] = merchant_id
+    return row
+
+
+def test_last_transactions_merge_late_sqlite_rows_with_archive(db, archive):
+    db.save_transactions([record('2024-12-05', 'MERCADO', '-50'), record('2024-12-01', 'PADARIA', '-8')])
+    assert archive.archive_closed_months(1) == 2
+    # Importação atrasada: fica no SQLite, mas é mais antiga que o arquivo
+    db.save_transactions([record('2024-03-20', 'FARMACIA', '-30')])
+
+    assert [t['date'] for t in archive.get_last_transactions(1, limit=2)] == ['05/12/2024', '01/12/2024']
+    assert [t['description'] for t in archive.get_last_transactions(1, limit=5)] == [
+        'MERCADO', 'PADARIA', 'FARMACIA'
+    ]
+
+
+@pytest.fixture
+def history(db):
+    db.save_transactions([
+        record('2024-01-05', 'SALARIO', '5000', merchant_id=1),
+        record('2024-01-10', 'NETFLIX', '-39,90', merchant_id=2),
+        record('2024-02-10', 'NETFLIX', '-39,90', merchant_id=2),
+        record('2024-02-15', 'MERCADO', '-250,35', merchant_id=3),
+        record('2024-03-01', 'PIX', '-10'),
+    ])
+    return db
+
+
+def test_archiving_keeps_balance_and_monthly_totals(history, archive):
+    balance = archive.get_balance(1)
+    totals = archive.get_monthly_totals(1)
+
+    assert archive.archive_closed_months(1) == 5
+    assert history.get_balance_cents(1) == 0
+    assert archive._archived_months(1) == [202401, 202402, 202403]
+    assert archive.get_balance(1) == balance == pytest.approx(4659.85)
+    assert archive.get_monthly_totals(1) == totals
+    assert totals[0] == {'month': 202401, 'income': 500000, 'expenses': -3990, 'count': 2}
+
+
+def test_late_rows_rewrite_the_archived_month(history, archive):
+    archive.archive_closed_months(1)
+    history.save_transactions([record('2024-02-01', 'PADARIA', '-12')])
+
+    assert archive.archive_closed_months(1) == 1
+    february = archive.get_transactions_between(1, to_day_number('2024-02-01'), to_day_number('2024-02-29'))
+    assert [r['description'] for r in february] == ['PADARIA', 'NETFLIX', 'MERCADO']
+    assert archive.get_monthly_totals(1)[1]['count'] == 3
+
+
+@pytest.mark.parametrize('fmt', ['csv', 'parquet'])
+def test_export_covers_both_tiers(history, archive, tmp_path, fmt):
+    archive.archive_closed_months(1)
+    history.save_transactions([record('2024-04-02', 'PADARIA', '-12')])
+    output = tmp_path / f'historico.{fmt}'
+
+    assert archive.export(1, str(output), fmt) == 6
+    if fmt == 'csv':
+        lines = output.read_text(encoding='utf-8').splitlines()
+        assert len(lines) == 7
+        assert lines[1] == '2024-01-05,SALARIO,5000.00,,file,'
+    else:
+        import pyarrow.parquet as pq
+        assert pq.read_table(output).num_rows == 6
+
+
+def test_export_rejects_unknown_format(archive, tmp_path):
+    with pytest.raises(ValueError):
+        archive.export(1, str(tmp_path / 'x'), 'xlsx')
+
+
+def test_expense_arrays_read_both_tiers(history, archive):
+    archive.archive_closed_months(1)
+    history.save_transactions([record('2024-04-10', 'NETFLIX', '-39,90', merchant_id=2)])
+
+    arrays = archive.load_expense_arrays(1)
+    order = arrays['date'].argsort()
+    assert arrays['merchant_id'][order].tolist() == [2, 2, 3, 2]
+    assert arrays['amount'][order].tolist() == [-3990, -3990, -25035, -3990]
+    assert archive.load_expense_arrays(1, merchant_ids=[3])['amount'].tolist() == [-25035]
+    assert archive.load_expense_arrays(2)['amount'].size == 0
+
+
+def hide_pyarrow(monkeypatch):
+    from src.financIA.core import archive as module
+    for name in ('pa', 'pc', 'pq'):
+        monkeypatch.setattr(module, name, None)
+
+
+def test_sqlite_only_users_do_not_need_pyarrow(history, archive, tmp_path, monkeypatch):
+    hide_pyarrow(monkeypatch)
+    assert archive.get_balance(1) == pytest.approx(4659.85)
+    assert len(archive.get_last_transactions(1)) == 5
+    assert len(archive.get_monthly_totals(1)) == 3
+    assert archive.load_expense_arrays(1)['amount'].size == 3
+    assert archive.export(1, str(tmp_path / 'historico.csv'), 'csv') == 5
+    with pytest.raises(RuntimeError, match="pyarrow"):
+        archive.archive_closed_months(1)
+    with pytest.raises(RuntimeError, match="pyarrow"):
+        archive.export(1, str(tmp_path / 'historico.parquet'), 'parquet')
+
+
+def test_archived_users_need_pyarrow(history, archive, monkeypatch):
+    archive.archive_closed_months(1)
+    hide_pyarrow(monkeypatch)
+    with pytest.raises(RuntimeError, match="pyarrow"):
+        archive.get_balance(1)
@@ -0,0 +1,31 @@
+import pytest
+
+from src.financIA.file_parsers.bank_parser import BradescoParser, ItauParser
+
+ITAU_CSV = (
+    "Data,Valor,Identificador,Descrição\n"
+    "05/03/2025,2709.00,abc-1,Transferência Recebida\n"
+    "05/03/2025,-3.00,abc-2,Compra no débito - Padaria\n"
+)
+
+
+@pytest.mark.parametrize('encoding', ['utf-8', 'utf-8-sig', 'iso-8859-1'])
+def test_itau_reads_utf8_and_latin1_exports(tmp_path, encoding):
+    path = tmp_path / 'extrato.csv'
+    path.write_bytes(ITAU_CSV.encode(encoding))
+
+    records = ItauParser().parse(str(path))
+
+    assert [(r['description'], r['amount'], r['external_id']) for r in records] == [
+        ("Transferência Recebida", 270900, 'abc-1'),
+        ("Compra no débito - Padaria", -300, 'abc-2'),
+    ]
+
+
+def test_bradesco_reads_latin1_with_brazilian_amounts(tmp_path):
+    path = tmp_path / 'extrato.csv'
+    path.write_bytes("Data;Histórico;Valor\n01/03/2025;Salário;1.234,56\n".encode('iso-8859-1'))
+
+    [record] = BradescoParser().parse(str(path))
+
+    assert (record['description'], record['amount']) == ("Salário", 123456)
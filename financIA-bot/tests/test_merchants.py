@@ -0,0 +1,113 @@
+import threading
+
+import pytest
+
+from src.financIA.core.database import DatabaseManager
+from src.financIA.core.merchants import MerchantIndex, normalize_description
+
+
+@pytest.fixture
+def index(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'transactions.db'), shard_mode='single')
+    yield MerchantIndex(db)
+    db.close()
+
+
+@pytest.mark.parametrize('first, second', [
+    ("PIX ENVIADO MARIA", "MARIA SANTOS"),
+    ("MARIA SANTOS", "MARIA OLIVEIRA"),
+    ("JOAO S", "JOAO SILVA"),
+    ("JOAO SILVA", "JOAO SOUZA"),
+    ("PADARIA SAO PAULO", "DROGARIA SAO PAULO"),
+])
+def test_distinct_counterparties_are_not_merged(index, first, second):
+    assert index.resolve(first) != index.resolve(second)
+
+
+@pytest.mark.parametrize('first, second', [
+    ("COMPRA CARTAO IFOOD *123", "IFOOD 12/03"),
+    ("NETFLIX.COM", "DEBITO AUTOMATICO NETFLIX COM"),
+    ("POSTO IPIRANGA", "POSTO IPIRANGA LTDA"),
+    ("SUPERMERCADO EXTRA", "SUPERMERCADO EXTRA SA"),
+    ("COMPRA CARTAO IFOOD *123", "IFOOD SAO PAULO"),
+    ("UBER *TRIP", "UBER TRIP SAO PAULO"),
+    ("IFOOD", "IFOOD SAO PAULO SP BR"),
+])
+def test_variants_of_the_same_merchant_are_merged(index, first, second):
+    assert index.resolve(first) == index.resolve(second)
+
+
+def test_resolution_survives_reload(index):
+    merchant_id = index.resolve("UBER TRIP")
+    assert MerchantIndex(index.db).resolve("UBER *TRIP") == merchant_id
+
+
+@pytest.mark.parametrize('description, expected', [
+    ("PAGAMENTO CONTA LUZ", "CONTA LUZ"),
+    ("BANCO INTER SA", "BANCO INTER SA"),
+    ("TED ENVIADA AG 1234 CC 56789-0 JOAO", "JOAO"),
+    ("PIX RECEBIDO MARIA BCO 260 AG 0001", "MARIA"),
+    ("PIX ENVIADO JOAO S 12/03", "JOAO S"),
+    ("COMPRA CARTAO IFOOD *123", "IFOOD"),
+    ("IFOOD SAO PAULO", "IFOOD"),
+    ("DROGARIA SAO PAULO", "DROGARIA"),
+    ("SAO PAULO", "SAO PAULO"),
+    ("PIX ENVIADO ANA CAMPINAS", "ANA CAMPINAS"),
+    ("99POP", "99POP"),
+    ("99 TAXI", "99 TAXI"),
+    ("7ELEVEN 004512", "7ELEVEN"),
+    ("LOJA 042X 8F3A9C21B7", "LOJA"),
+    ("MAGAZINE PARC 1/3", "MAGAZINE PARC"),
+])
+def test_normalize_description(description, expected):
+    assert normalize_description(description) == expected
+
+
+def test_request_examples_resolve_to_their_counterparties(index):
+    joao = index.resolve("PIX ENVIADO JOAO S 12/03")
+    ifood = index.resolve("COMPRA CARTAO IFOOD *123")
+    assert index.resolve("IFOOD SAO PAULO") == ifood
+    assert joao != ifood
+
+
+def test_known_descriptions_resolve_without_lock_or_write(index):
+    ifood = index.resolve("COMPRA CARTAO IFOOD *123")
+
+    class NoLock:
+        def __enter__(self):
+            raise AssertionError("lock tomado para descrição conhecida")
+
+        def __exit__(self, *exc):
+            return False
+
+    index._lock = NoLock()
+    assert index.resolve_many(["IFOOD SAO PAULO", "COMPRA CARTAO IFOOD *9"]) == [ifood, ifood]
+
+
+def test_new_variants_in_one_batch_share_a_merchant(index):
+    first, second, other = index.resolve_many(["NETFLIX.COM", "DEBITO AUTOMATICO NETFLIX COM", "SPOTIFY"])
+    assert first == second != other
+
+    reloaded = MerchantIndex(index.db)
+    assert reloaded.resolve("NETFLIX COM") == first
+    assert reloaded.name(other) == "SPOTIFY"
+
+
+def test_concurrent_imports_agree_on_new_merchants(index):
+    descriptions = [f"PIX ENVIADO {name}" for name in ("ANA LIMA", "BRUNO COSTA", "CARLA DIAS", "DANIEL REIS")]
+    batches = [descriptions[i % 4:] + descriptions[:i % 4] for i in range(8)]
+    results = [None] * len(batches)
+
+    def worker(i):
+        results[i] = dict(zip(batches[i], index.resolve_many(batches[i])))
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(batches))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert all(result == results[0] for result in results)
+    assert len(set(results[0].values())) == len(descriptions)
+    with index.db._get_connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM merchants").fetchone()[0] == len(descriptions)
@@ -0,0 +1,82 @@
+import sqlite3
+
+import pytest
+
+from src.financIA.core import migrations
+from src.financIA.core.records import to_day_number
+
+LEGACY_SCHEMA = """
+    CREATE TABLE transactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date TEXT NOT NULL,
+        description TEXT NOT NULL,
+        amount REAL NOT NULL,
+        category TEXT,
+        user_id INTEGER
+    )"""
+
+
+@pytest.fixture
+def legacy(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'transactions.db'))
+    conn.execute(LEGACY_SCHEMA)
+    yield conn
+    conn.close()
+
+
+def insert(conn, *rows):
+    conn.executemany(
+        "INSERT INTO transactions (id, date, description, amount, category, user_id) VALUES (?, ?, ?, ?, ?, ?)",
+        rows
+    )
+    conn.commit()
+
+
+def test_migrate_converts_rows_and_drops_legacy_table(legacy):
+    insert(legacy,
+           (1, "2024-03-01", "SALARIO", 1500.1, "Renda", 7),
+           (2, "02/03/2024", "PADARIA", -0.29, None, 7))
+
+    assert migrations.needs_migration(legacy)
+    stats = migrations.migrate_connection(legacy)
+
+    assert stats == {'migrated': 2, 'skipped': 0}
+    assert not migrations.needs_migration(legacy)
+    rows = legacy.execute("SELECT id, user_id, date, amount, source FROM transactions ORDER BY id").fetchall()
+    assert rows == [
+        (1, 7, to_day_number("2024-03-01"), 150010, 'legacy'),
+        (2, 7, to_day_number("2024-03-02"), -29, 'legacy'),
+    ]
+    assert legacy.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE name = 'transactions_legacy'"
+    ).fetchone()[0] == 0
+
+
+def test_migrate_keeps_rows_it_cannot_convert(legacy):
+    insert(legacy,
+           (1, "2024-03-01", "OK", -10.0, None, 7),
+           (2, "ontem", "DATA RUIM", -5.0, None, 7),
+           (3, "2024-03-03", "VALOR RUIM", "abc", None, 7),
+           (4, "2024-03-04", "OK", 20.5, None, 8))
+
+    stats = migrations.migrate_connection(legacy)
+
+    assert stats == {'migrated': 2, 'skipped': 2}
+    assert [r[0] for r in legacy.execute("SELECT id FROM transactions ORDER BY id")] == [1, 4]
+    # As linhas ignoradas continuam na tabela legada para correção manual
+    kept = legacy.execute("SELECT id FROM transactions_legacy ORDER BY id").fetchall()
+    assert [r[0] for r in kept] == [1, 2, 3, 4]
+    # Novos ids continuam acima dos já emitidos pela tabela legada
+    legacy.execute("INSERT INTO transactions (user_id, date, description, amount) VALUES (7, 0, 'NOVA', 1)")
+    assert legacy.execute("SELECT MAX(id) FROM transactions").fetchone()[0] == 5
+
+
+def test_migrate_file_skips_current_schema(tmp_path):
+    path = tmp_path / 'transactions.db'
+    conn = sqlite3.connect(str(path))
+    migrations.create_schema(conn)
+    conn.commit()
+    conn.close()
+
+    assert migrations.migrate_file(str(path)) == {'migrated': 0, 'skipped': 0}
+    assert not (tmp_path / 'transactions.db.bak').exists()
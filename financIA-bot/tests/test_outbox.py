@@ -0,0 +1,176 @@
+import asyncio
+
+import pytest
+
+from src.financIA.bot.outbox import COALESCE_SEPARATOR, MAX_MESSAGE_LENGTH, OutboundQueue, TokenBucket
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+        self.fail_next = None
+        self.gate = None
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if self.gate is not None:
+            await self.gate.wait()
+        if self.fail_next is not None:
+            error, self.fail_next = self.fail_next, None
+            raise error
+        self.sent.append((chat_id, text))
+        return text
+
+
+def test_token_bucket_burst_then_rate():
+    bucket = TokenBucket(rate=2, capacity=3)
+    bucket.updated = 0.0
+    for _ in range(3):
+        assert bucket.delay(0.0) == 0.0
+        bucket.consume(0.0)
+    assert bucket.delay(0.0) == pytest.approx(0.5)
+    assert bucket.delay(0.5) == 0.0
+    assert not bucket.is_full(0.5)
+    assert bucket.is_full(10.0)
+    assert bucket.tokens == 3
+
+
+def test_notify_coalesces_pending_messages_per_chat():
+    queue = OutboundQueue(FakeBot(), global_rate=25, chat_rate=1, chat_burst=3)
+    queue.notify(1, "a")
+    queue.notify(1, "b")
+    queue.notify(2, "c")
+
+    assert queue.stats()['coalesced'] == 1
+    message = queue._take_background(queue._background[1])
+    assert message.texts == ["a" + COALESCE_SEPARATOR + "b"]
+    assert set(queue._background) == {2}
+
+
+def test_coalesced_notices_are_split_at_telegram_limit():
+    queue = OutboundQueue(FakeBot(), global_rate=25, chat_rate=1, chat_burst=3)
+    big = "x" * (MAX_MESSAGE_LENGTH - 10)
+    queue.notify(1, big)
+    queue.notify(1, "y" * 20)
+
+    first = queue._take_background(queue._background[1])
+    assert first.texts == [big]
+    second = queue._take_background(queue._background[1])
+    assert second.texts == ["y" * 20]
+    assert not queue._background
+
+
+def test_worker_survives_failure_after_caller_was_cancelled():
+    async def scenario():
+        bot = FakeBot()
+        bot.gate = asyncio.Event()
+        bot.fail_next = RuntimeError("falha de rede")
+        queue = OutboundQueue(bot, global_rate=25, chat_rate=10, chat_burst=10)
+        await queue.start()
+
+        task = asyncio.create_task(queue.send(1, "primeira"))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.sleep(0)
+        bot.gate.set()
+        await asyncio.sleep(0.05)
+
+        assert not queue._worker.done()
+        result = await asyncio.wait_for(queue.send(1, "segunda"), timeout=2)
+        await queue.stop()
+        return result, bot.sent
+
+    result, sent = asyncio.run(scenario())
+    assert result == "segunda"
+    assert sent == [(1, "segunda")]
+
+
+def test_documents_go_through_the_queue():
+    class DocumentBot(FakeBot):
+        async def send_document(self, chat_id, document, **kwargs):
+            self.sent.append((chat_id, document, kwargs["caption"]))
+            return document
+
+    async def scenario():
+        bot = DocumentBot()
+        queue = OutboundQueue(bot, global_rate=25, chat_rate=10, chat_burst=10)
+        await queue.start()
+        result = await asyncio.wait_for(queue.send_document(1, "historico.csv", caption="ok"), timeout=2)
+        stats = queue.stats()
+        await queue.stop()
+        return result, bot.sent, stats
+
+    result, sent, stats = asyncio.run(scenario())
+    assert result == "historico.csv"
+    assert sent == [(1, "historico.csv", "ok")]
+    assert stats["sent"] == 1
+
+
+class SlowBot(FakeBot):
+    """Mensagens levam 20 ms; documentos, 300 ms (escala 1:10 do Telegram real)"""
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await asyncio.sleep(0.02)
+        self.sent.append((chat_id, text))
+        return text
+
+    async def send_document(self, chat_id, document, **kwargs):
+        await asyncio.sleep(0.3)
+        self.sent.append((chat_id, document))
+        return document
+
+
+def test_slow_document_does_not_block_other_chats():
+    async def scenario():
+        bot = SlowBot()
+        queue = OutboundQueue(bot, global_rate=100, chat_rate=10, chat_burst=10, max_in_flight=8)
+        await queue.start()
+        loop = asyncio.get_running_loop()
+        document = asyncio.create_task(queue.send_document(0, "historico.parquet"))
+        await asyncio.sleep(0)
+        started = loop.time()
+        await asyncio.wait_for(asyncio.gather(*(queue.send(chat_id, "ok") for chat_id in range(1, 21))),
+                               timeout=2)
+        replies = loop.time() - started
+        await document
+        await queue.stop()
+        return replies
+
+    # Em série seriam 0.3 + 20 * 0.02 = 0.7 s; em paralelo, 3 lotes de 20 ms
+    assert asyncio.run(scenario()) < 0.25
+
+
+def test_messages_to_the_same_chat_keep_their_order():
+    class JitterBot(FakeBot):
+        async def send_message(self, chat_id, text, **kwargs):
+            # A primeira mensagem é a mais lenta: em paralelo chegaria por último
+            await asyncio.sleep(0.05 if text == "0" else 0.0)
+            self.sent.append((chat_id, text))
+            return text
+
+    async def scenario():
+        bot = JitterBot()
+        queue = OutboundQueue(bot, global_rate=100, chat_rate=50, chat_burst=50, max_in_flight=8)
+        await queue.start()
+        await asyncio.wait_for(asyncio.gather(*(queue.send(1, str(i)) for i in range(5))), timeout=2)
+        await queue.stop()
+        return bot.sent
+
+    assert asyncio.run(scenario()) == [(1, str(i)) for i in range(5)]
+
+
+def test_stop_cancels_sends_in_flight():
+    async def scenario():
+        bot = FakeBot()
+        bot.gate = asyncio.Event()
+        queue = OutboundQueue(bot, global_rate=25, chat_rate=10, chat_burst=10)
+        await queue.start()
+        pending = asyncio.create_task(queue.send(1, "presa"))
+        await asyncio.sleep(0.05)
+        await queue.stop()
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(pending, timeout=1)
+        return queue.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["sent"] == 0
+    assert stats["interactive_queued"] == 0
@@ -0,0 +1,66 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+
+from src.financIA.core.records import from_day_number, month_key, to_cents, to_day_number
+
+
+@pytest.mark.parametrize('value, expected', [
+    (10, 1000),
+    (-3, -300),
+    (0.1, 10),
+    (0.29, 29),
+    (1.005, 101),
+    (-1.005, -101),
+    (Decimal('2.345'), 235),
+    ("1.234,56", 123456),
+    ("R$ -1.234,56", -123456),
+    ("12,5", 1250),
+    ("1234.56", 123456),
+    ("1,234.56", 123456),
+    ("-2,709.00", -270900),
+    ("1,234,567.89", 123456789),
+    ("1.234.567", 123456700),
+    ("1.234.567,89", 123456789),
+    ("0,5", 50),
+    (" 7 ", 700),
+])
+def test_to_cents(value, expected):
+    assert to_cents(value) == expected
+
+
+@pytest.mark.parametrize('value', [True, False, "", "abc", "1,2,3", "12,34.56", "1.2345,00", float('nan'), float('inf'), "NaN", None])
+def test_to_cents_rejects_invalid_values(value):
+    with pytest.raises(ValueError):
+        to_cents(value)
+
+
+@pytest.mark.parametrize('value', [
+    "2024-02-29",
+    "29/02/2024",
+    "29/02/24",
+    "2024/02/29",
+    "29-02-2024",
+    "20240229",
+    "2024-02-29T23:59:59",
+    "2024-02-29 10:00:00",
+    " 2024-02-29 ",
+    date(2024, 2, 29),
+    datetime(2024, 2, 29, 23, 59),
+])
+def test_to_day_number_formats(value):
+    day = to_day_number(value)
+    assert from_day_number(day) == date(2024, 2, 29)
+    assert month_key(day) == 202402
+
+
+def test_to_day_number_epoch_and_before():
+    assert to_day_number("1970-01-01") == 0
+    assert to_day_number("31/12/1969") == -1
+
+
+@pytest.mark.parametrize('value', ["", "ontem", "30/02/2024", "2023-02-29", "2024-13-01"])
+def test_to_day_number_rejects_invalid_dates(value):
+    with pytest.raises(ValueError, match="Data inválida"):
+        to_day_number(value)
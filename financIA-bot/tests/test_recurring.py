@@ -0,0 +1,115 @@
+import numpy as np
+import pytest
+
+from src.financIA.core.archive import TransactionArchive
+from src.financIA.core.database import DatabaseManager
+from src.financIA.core.merchants import MerchantIndex
+from src.financIA.core.records import normalize_transaction, to_day_number
+from src.financIA.core.recurring import RecurringDetector, detect
+
+
+def series(dates, amount=-3990, key=1):
+    days = np.array([to_day_number(d) for d in dates], dtype=np.int64)
+    return days, np.full(len(days), amount, dtype=np.int64), np.full(len(days), key, dtype=np.int64)
+
+
+@pytest.mark.parametrize('dates, period', [
+    (['2025-01-06', '2025-01-13', '2025-01-20', '2025-01-28', '2025-02-03'], 7),
+    (['2025-01-31', '2025-03-01', '2025-03-31', '2025-04-30', '2025-05-31'], 30),
+    (['2025-01-31', '2025-02-28', '2025-03-31', '2025-04-30'], 30),
+    (['2022-03-10', '2023-03-10', '2024-03-11'], 365),
+    (['2025-01-03', '2025-01-05', '2025-02-20', '2025-02-21', '2025-04-30'], 0),
+    (['2025-01-10', '2025-02-10'], 0),
+])
+def test_detect_periods(dates, period):
+    result = detect(*series(dates))
+    assert result['period'].tolist() == [period]
+    assert result['last_day'].tolist() == [to_day_number(dates[-1])]
+
+
+def test_detect_groups_merchants_in_one_pass():
+    monthly = series(['2025-01-05', '2025-02-05', '2025-03-05'], key=7)
+    weekly = series(['2025-01-01', '2025-01-08', '2025-01-15', '2025-01-22'], key=3)
+    days, amounts, keys = (np.concatenate(parts) for parts in zip(monthly, weekly))
+
+    result = detect(days, amounts, keys)
+
+    assert dict(zip(result['key'].tolist(), result['period'].tolist())) == {3: 7, 7: 30}
+    assert detect(*(np.zeros(0, dtype=np.int64),) * 3)['key'].size == 0
+
+
+def test_mad_outlier_is_flagged():
+    days = np.arange(6, dtype=np.int64) * 7
+    amounts = np.array([-5000, -5200, -4900, -5100, -15000, -5050], dtype=np.int64)
+    result = detect(days, amounts, np.ones(6, dtype=np.int64))
+    assert result['outliers'].tolist() == [False, False, False, False, True, False]
+
+
+def test_fixed_amount_outliers_need_a_real_deviation():
+    days = np.arange(6, dtype=np.int64) * 30
+    amounts = np.array([-3990, -3990, -3990, -4000, -3990, -4990], dtype=np.int64)
+    result = detect(days, amounts, np.ones(6, dtype=np.int64))
+    # -40,00 fica dentro da tolerância de uma assinatura fixa; -49,90 não
+    assert result['outliers'].tolist() == [False, False, False, False, False, True]
+
+
+def test_short_histories_have_no_outliers():
+    days = np.array([0, 30, 60], dtype=np.int64)
+    amounts = np.array([-3990, -3990, -9990], dtype=np.int64)
+    assert not detect(days, amounts, np.ones(3, dtype=np.int64))['outliers'].any()
+
+
+@pytest.fixture
+def setup(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'transactions.db'), shard_mode='single')
+    detector = RecurringDetector(db, TransactionArchive(db, str(tmp_path / 'archive')))
+    yield db, MerchantIndex(db), detector
+    db.close()
+
+
+def save(db, merchants, rows):
+    records = [normalize_transaction(day, description, amount, source='file', user_id=1)
+               for day, description, amount in rows]
+    for record, merchant_id in zip(records, merchants.resolve_many([r['description'] for r in records])):
+        record['merchant_id'] = merchant_id
+    db.save_transactions(records)
+    return records
+
+
+def test_update_only_flags_new_rows_and_notifies_once(setup):
+    db, merchants, detector = setup
+    history = save(db, merchants, [(f'2025-{m:02d}-05', 'NETFLIX', '-99,90' if m == 3 else '-39,90')
+                                   for m in range(1, 7)])
+
+    first = detector.update(1, history)
+    assert [(p['name'], p['period_days'], p['occurrences']) for p in first['recurring']] == [('NETFLIX', 30, 6)]
+    assert [a['amount'] for a in first['anomalies']] == [-9990]
+
+    new = save(db, merchants, [('2025-07-05', 'NETFLIX', '-39,90'), ('2025-07-07', 'NETFLIX', '-59,90')])
+    second = detector.update(1, new)
+    # O padrão já foi avisado; a anomalia antiga não volta
+    assert second['recurring'] == []
+    assert [(a['amount'], a['expected']) for a in second['anomalies']] == [(-5990, -3990)]
+    assert detector.get_patterns(1)[0]['next_day'] == to_day_number('2025-07-07') + 30
+
+
+def test_pattern_is_deleted_when_it_stops_being_periodic(setup):
+    db, merchants, detector = setup
+    history = save(db, merchants, [(f'2025-{m:02d}-05', 'SPOTIFY', '-21,90') for m in range(1, 4)])
+    assert len(detector.update(1, history)['recurring']) == 1
+
+    irregular = save(db, merchants, [(f'2025-03-{d:02d}', 'SPOTIFY', '-21,90') for d in (6, 8, 9, 12, 13)])
+    detector.update(1, irregular)
+    assert detector.get_patterns(1) == []
+
+
+def test_scan_without_marking_leaves_patterns_for_the_next_import(setup):
+    db, merchants, detector = setup
+    save(db, merchants, [(f'2025-{m:02d}-05', 'NETFLIX', '-39,90') for m in range(1, 5)])
+
+    assert detector.scan_all() == {'users': 1, 'patterns': 1}
+    assert detector.scan(1, mark_notified=False)['recurring'][0]['name'] == 'NETFLIX'
+
+    new = save(db, merchants, [('2025-05-05', 'NETFLIX', '-39,90')])
+    assert [p['name'] for p in detector.update(1, new)['recurring']] == ['NETFLIX']
+    assert detector.update(1, new)['recurring'] == []
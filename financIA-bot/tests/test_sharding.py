@@ -0,0 +1,107 @@
+import sqlite3
+
+import pytest
+
+from src.financIA.core.database import DatabaseManager
+from src.financIA.core.records import TransactionRecord
+from src.financIA.core.sharding import ConnectionCache, HashRing, move_user, rebalance
+
+KEYS = [str(user_id) for user_id in range(5000)]
+
+
+def test_hash_ring_is_deterministic():
+    nodes = [f"shard_{i:03d}" for i in range(4)]
+    first, second = HashRing(nodes), HashRing(reversed(nodes))
+    assert [first.node_for(k) for k in KEYS] == [second.node_for(k) for k in KEYS]
+    assert set(first.node_for(k) for k in KEYS) == set(nodes)
+
+
+def test_adding_a_shard_only_moves_keys_to_it():
+    before = HashRing(f"shard_{i:03d}" for i in range(4))
+    after = HashRing(f"shard_{i:03d}" for i in range(5))
+
+    moved = [k for k in KEYS if before.node_for(k) != after.node_for(k)]
+    assert {after.node_for(k) for k in moved} == {"shard_004"}
+    # ~1/(N+1) dos usuários muda de arquivo
+    assert 0.1 < len(moved) / len(KEYS) < 0.3
+
+
+def test_empty_ring_is_rejected():
+    with pytest.raises(ValueError):
+        HashRing([])
+
+
+def test_connection_cache_evicts_least_recently_used_file(tmp_path):
+    cache = ConnectionCache(lambda path: sqlite3.connect(path, check_same_thread=False), max_open=2)
+    paths = [str(tmp_path / f"{name}.db") for name in "abc"]
+    conns = {path: cache.acquire(path) for path in paths}
+    for path in paths:
+        cache.release(path, conns[path])
+
+    assert cache.stats() == {'hits': 0, 'misses': 3, 'evictions': 1, 'idle': 2, 'files': 2}
+    assert cache.acquire(paths[2]) is conns[paths[2]]
+    assert cache.acquire(paths[0]) is not conns[paths[0]]
+    cache.close_all()
+
+
+def records(user_id, count):
+    return [TransactionRecord(date=19000 + i, description=f"COMPRA {i}", amount=-(i + 1) * 100,
+                              user_id=user_id, source='file') for i in range(count)]
+
+
+def ids_by_user(db, users):
+    result = {}
+    for user_id in users:
+        with db._get_connection(user_id) as conn:
+            result[user_id] = [r[0] for r in conn.execute(
+                "SELECT id FROM transactions WHERE user_id = ? ORDER BY id", (user_id,))]
+    return result
+
+
+def test_rebalance_from_single_file_preserves_ids_and_balances(tmp_path):
+    path = str(tmp_path / 'transactions.db')
+    users = range(1, 9)
+    single = DatabaseManager(path, shard_mode='single')
+    for user_id in users:
+        single.save_transactions(records(user_id, 5))
+    balances = {u: single.get_balance_cents(u) for u in users}
+    ids = ids_by_user(single, users)
+    single.close()
+
+    sharded = DatabaseManager(path, shard_mode='hash', shards=4)
+    stats = rebalance(sharded)
+
+    assert stats == {'users': 8, 'transactions': 40}
+    assert {u: sharded.get_balance_cents(u) for u in users} == balances
+    assert ids_by_user(sharded, users) == ids
+    with sharded._get_connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0] == 0
+    # Repetir não move nem duplica nada
+    assert rebalance(sharded) == {'users': 0, 'transactions': 0}
+    assert sum(r['transactions'] for r in sharded.get_shard_stats()) == 40
+    sharded.close()
+
+
+def test_move_user_renumbers_colliding_ids_and_is_idempotent(tmp_path):
+    path = str(tmp_path / 'transactions.db')
+    per_user = DatabaseManager(path, shard_mode='user')
+    per_user.save_transactions(records(1, 3))
+    per_user.save_transactions(records(2, 3))
+    source_1, source_2 = per_user.shard_path(1), per_user.shard_path(2)
+    per_user.close()
+
+    target = str(tmp_path / 'merged.db')
+    db = DatabaseManager(path, shard_mode='single')
+    assert move_user(db, 1, source_1, target) == 3
+    assert move_user(db, 2, source_2, target) == 3
+    assert move_user(db, 2, source_2, target) == 0
+
+    with db._connect(target) as conn:
+        rows = conn.execute("SELECT id, user_id FROM transactions ORDER BY id").fetchall()
+        # Ids do usuário 2 colidiam com os do 1 e foram renumerados acima deles
+        assert [tuple(r) for r in rows] == [(1, 1), (2, 1), (3, 1), (4, 2), (5, 2), (6, 2)]
+        conn.execute("INSERT INTO transactions (user_id, date, description, amount) VALUES (3, 0, 'NOVA', 1)")
+        assert conn.execute("SELECT MAX(id) FROM transactions").fetchone()[0] == 7
+    with db._connect(source_2) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0] == 0
+    db.close()
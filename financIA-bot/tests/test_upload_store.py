@@ -0,0 +1,62 @@
+import sqlite3
+
+import pytest
+
+from src.financIA.core.database import DatabaseManager
+from src.financIA.core.records import normalize_transaction
+from src.financIA.utils.upload_store import UploadStore, row_fingerprints
+
+
+def record(day, description, amount, external_id=None):
+    return normalize_transaction(day, description, amount, source='file', external_id=external_id)
+
+
+@pytest.fixture
+def store(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'transactions.db'), shard_mode='single')
+    yield UploadStore(db, str(tmp_path / 'uploads'))
+    db.close()
+
+
+def test_fingerprints_ignore_case_and_spacing():
+    a = row_fingerprints([record('2025-03-01', 'Padaria  Central', '-10,00')])
+    b = row_fingerprints([record('01/03/2025', 'PADARIA CENTRAL', '-10.00')])
+    assert a == b
+
+
+def test_identical_rows_in_one_statement_stay_distinct():
+    rows = [record('2025-03-01', 'CAFE', '-5')] * 2
+    first, second = row_fingerprints(rows)
+    assert first != second
+    assert first.endswith('#1') and second.endswith('#2')
+
+
+def test_external_id_takes_precedence():
+    a = row_fingerprints([record('2025-03-01', 'PIX', '-5', external_id='abc')])
+    b = row_fingerprints([record('2025-03-02', 'PIX ENVIADO', '-7', external_id='abc')])
+    assert a == b == ['id:abc#1']
+
+
+def test_overlapping_statements_only_import_new_rows(store):
+    march = [record(f'2025-03-{d:02d}', f'LOJA {d}', '-1') for d in range(1, 11)]
+    new, fingerprints = store.filter_new_rows(1, march)
+    store.db.save_transactions(new, 1, fingerprints)
+
+    # Extrato seguinte repete os últimos 5 dias e traz 3 novos
+    overlap = march[5:] + [record(f'2025-03-{d:02d}', f'LOJA {d}', '-1') for d in range(11, 14)]
+    new, fingerprints = store.filter_new_rows(1, overlap)
+    assert [r['description'] for r in new] == ['LOJA 11', 'LOJA 12', 'LOJA 13']
+    assert len(fingerprints) == 3
+
+    # Outro usuário com as mesmas linhas importa tudo
+    assert len(store.filter_new_rows(2, overlap)[0]) == 8
+
+
+def test_rows_and_fingerprints_are_written_together(store):
+    rows = [record('2025-03-01', 'LOJA', '-1')]
+    with pytest.raises(sqlite3.Error):
+        store.db.save_transactions(rows, 1, [object()])
+
+    assert store.db.get_balance_cents(1) == 0
+    new, fingerprints = store.filter_new_rows(1, rows)
+    assert len(new) == 1